@@ -0,0 +1,151 @@
+# フォルダ内のワークブックをまとめてスコア計算し、1つの Parquet / CSV ファイルに出力する（Streamlit は使わない）
+#   python batch_score.py 入力フォルダ 出力.parquet --workers 8
+#   python batch_score.py 入力フォルダ 出力.csv
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from cleaning import CLEANERS
+from ingest import SHEETS, missing_sheets, read_workbook
+from memory import compact_frame
+from scoring import SCORE_COLUMNS, add_scores
+
+# 出力の列（ファイルやシートによらず同じ列にそろえる）
+TEXT_COLUMNS = ['ファイル', 'シート', '企業名', '業種']
+NUMBER_COLUMNS = ['自己資本比率', 'ROE', 'ROA', 'PER', 'PBR', '配当利回り', '時価', '株価', '1株当たり配当金', '購入株数']
+OUTPUT_COLUMNS = TEXT_COLUMNS + ['行番号'] + NUMBER_COLUMNS + SCORE_COLUMNS + ['合計スコア', 'エラー']
+
+
+def _output_frame(df):
+    df = df.reindex(columns=OUTPUT_COLUMNS)
+    for column in TEXT_COLUMNS + ['エラー']:
+        df[column] = df[column].astype('string')
+    df['行番号'] = df['行番号'].astype('Int64')
+    for column in NUMBER_COLUMNS:
+        df[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+    for column in SCORE_COLUMNS + ['合計スコア']:
+        df[column] = df[column].astype('Int8')
+    return df
+
+
+def score_file(path):
+    """1つのワークブックの各シートを Page 1 / Page 2 と同じ前処理でスコア計算する（エラーは行として返す）。"""
+    name = os.path.basename(path)
+    try:
+        with open(path, 'rb') as f:
+            datasets = read_workbook(f.read())
+        frames = []
+        for key, df in datasets.items():
+            scored = add_scores(CLEANERS[key](compact_frame(df)))
+            scored.insert(0, 'ファイル', name)
+            scored.insert(1, 'シート', SHEETS[key])
+            scored.insert(2, '行番号', range(1, len(scored) + 1))
+            frames.append(_output_frame(scored))
+        # ないシートはシートごとのエラーの行にする
+        for sheet_name in missing_sheets(datasets).values():
+            frames.append(_output_frame(pd.DataFrame({'ファイル': [name], 'シート': [sheet_name],
+                                                      'エラー': [f"シートが見つかりません: {sheet_name}"]})))
+        return pd.concat(frames, ignore_index=True)
+    except Exception as e:
+        return _output_frame(pd.DataFrame({'ファイル': [name], 'エラー': [f'{type(e).__name__}: {e}']}))
+
+
+class _ParquetOutput:
+    def __init__(self, path):
+        import pyarrow as pa
+
+        self.path = path
+        self.schema = pa.Schema.from_pandas(_output_frame(pd.DataFrame()), preserve_index=False)
+        self.writer = None
+
+    def write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        if self.writer is None:
+            self.write(_output_frame(pd.DataFrame()))
+        self.writer.close()
+
+
+class _CsvOutput:
+    def __init__(self, path):
+        self.path = path
+        # Excel で開けるように BOM 付きの UTF-8 にする
+        _output_frame(pd.DataFrame()).to_csv(path, index=False, encoding='utf-8-sig')
+
+    def write(self, df):
+        df.to_csv(self.path, mode='a', header=False, index=False, encoding='utf-8')
+
+    def close(self):
+        pass
+
+
+def _open_output(path):
+    if path.lower().endswith('.csv'):
+        return _CsvOutput(path)
+    return _ParquetOutput(path)
+
+
+def score_directory(input_dir, output_path, workers=None, pattern='*.xlsx', log=sys.stderr):
+    """フォルダ内のワークブックを並列に処理し、終わったものから順に出力ファイルに書き込む。"""
+    paths = sorted(glob.glob(os.path.join(input_dir, pattern)))
+    workers = workers or os.cpu_count() or 1
+    output = _open_output(output_path)
+    summary = {'files': len(paths), 'rows': 0, 'errors': 0}
+    start = time.perf_counter()
+
+    # 結果はファイルごとに書き出し、処理中のファイルはプロセス数の2倍までにしてメモリを抑える
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        remaining = iter(paths)
+        done_count = 0
+        while True:
+            for path in remaining:
+                pending.add(executor.submit(score_file, path))
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                df = future.result()
+                output.write(df)
+                done_count += 1
+                messages = df['エラー'].dropna()
+                errors = len(messages)
+                summary['rows'] += len(df) - errors
+                summary['errors'] += errors
+                status = f"{len(df) - errors:,} 行" + ''.join(f"、エラー: {message}" for message in messages)
+                print(f"[{done_count}/{len(paths)}] {df['ファイル'].iloc[0]}: {status}", file=log, flush=True)
+    output.close()
+
+    summary['elapsed_s'] = round(time.perf_counter() - start, 2)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="フォルダ内のワークブックをまとめてスコア計算する")
+    parser.add_argument('input_dir')
+    parser.add_argument('output', help="出力ファイル（拡張子が .csv なら CSV、それ以外は Parquet）")
+    parser.add_argument('--workers', type=int, default=None, help="プロセス数（既定は CPU コア数）")
+    parser.add_argument('--pattern', default='*.xlsx')
+    args = parser.parse_args(argv)
+
+    summary = score_directory(args.input_dir, args.output, args.workers, args.pattern)
+    print(f"{summary['files']} ファイル・{summary['rows']:,} 行を出力しました"
+          f"（エラー {summary['errors']} 件、{summary['elapsed_s']} 秒）", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+# 各ページの処理を段階ごとに計測し、結果を JSON で保存する（Streamlit もブラウザも使わない）
+#   python benchmark.py --rows 100 1000 10000 --output bench.json
+#   python benchmark.py --rows 100 1000 10000 --compare bench.json
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import warnings
+
+import matplotlib
+
+# 画面のない環境でも描画できるようにする
+matplotlib.use('Agg')
+
+import numpy as np
+import pandas as pd
+
+from chart_cache import chart_cache
+from charts import render_chart
+from cleaning import CLEANERS
+from history import DIVIDEND_AVERAGE_YEARS, HistoryStore
+from indexes import RankingIndex
+from ingest import read_workbook
+from memory import compact_frame
+from montecarlo import histogram, latest_dividend, simulate
+from optimizer import optimize_portfolio
+from scoring import SCORE_COLUMNS, combine_scores, score_frame, score_lists
+from simulation import AFTER_TAX_RATIO, CandidateSweep, amount_grid
+from synthetic import make_workbook
+from vega_charts import chart_spec
+
+DEFAULT_ROWS = [100, 1000, 10000]
+DEFAULT_WORKBOOK_DIR = os.path.join('.cache', 'benchmark')
+
+# 前回より最短時間がこの割合以上遅くなり、かつ差が MIN_REGRESSION_MS 以上なら性能の低下とみなす
+# （中央値より他の処理の影響を受けにくい最短時間で比べる）
+REGRESSION_THRESHOLD = 0.2
+MIN_REGRESSION_MS = 5.0
+
+# 最適化は候補数 × 予算のマス数の表を作るため、候補数をこの件数までに絞って計測する
+OPTIMIZER_CANDIDATES = 1000
+SCENARIO_PATHS = 10000
+
+
+def _measure(results, rows, stage, func, repeat):
+    elapsed = []
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        elapsed.append((time.perf_counter() - start) * 1000)
+    results.append({
+        'rows': rows,
+        'stage': stage,
+        'repeat': repeat,
+        'min_ms': round(min(elapsed), 2),
+        'median_ms': round(statistics.median(elapsed), 2),
+    })
+    print(f"{rows:>9,} {stage:<32} {statistics.median(elapsed):>10.1f} ms", flush=True)
+    return value
+
+
+def _chart_params(page1_scored, page2_scored, frontier, outcomes):
+    names = page1_scored['企業名'].astype(str).tolist()
+    edges, counts = histogram(outcomes)
+    labels = list(outcomes)
+    return {
+        'radar_multiple': dict(data=score_lists(page1_scored.head(5)), categories=SCORE_COLUMNS, titles=names[:5],
+                               chart_size=(6, 6), label_size=8),
+        'radar_side_by_side': dict(data=score_lists(page1_scored.head(4)), categories=SCORE_COLUMNS, titles=names[:4],
+                                   chart_size=(4, 4)),
+        'bar': dict(labels=page2_scored['企業名'].astype(str).head(10).tolist(),
+                    series=[(page2_scored['株価'].head(10).astype(float).round().tolist(), '株価（円）', 'blue')],
+                    xlabel='企業名', ylabel='株価（円）', title='株価の比較'),
+        'comparison_bar': dict(labels=['保有', '買い替え後'], values=[float(outcomes[labels[0]].mean()), float(outcomes[labels[1]].mean())],
+                               ylabel='配当金（円）', tick_step=500000),
+        'frontier': dict(market_values=frontier['時価'].tolist(), dividends=frontier['推定配当金'].tolist(),
+                         labels=frontier['企業名'].astype(str).tolist()),
+        'histogram': dict(edges=edges.tolist(), xlabel='年間配当金（円）',
+                          series=[(counts[labels[0]].tolist(), labels[0], 'blue'), (counts[labels[1]].tolist(), labels[1], 'green')]),
+    }
+
+
+def bench_workbook(path, rows, repeat):
+    """1つのワークブックについて、読み込みから Page 3 の計算までを段階ごとに計測する。"""
+    results = []
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    # 読み込みは時間がかかるため1回だけ計測する
+    raw = _measure(results, rows, 'parse', lambda: read_workbook(data), 1)
+    datasets = _measure(results, rows, 'compact', lambda: {key: compact_frame(df) for key, df in raw.items()}, repeat)
+
+    scored = {}
+    for key, df in datasets.items():
+        page = key.replace('_data', '')
+        cleaned = _measure(results, rows, f'{page}_coerce', lambda: CLEANERS[key](df), repeat)
+        scores = _measure(results, rows, f'{page}_score', lambda: score_frame(cleaned), repeat)
+        for method in ['percentile', 'zscore']:
+            _measure(results, rows, f'{page}_score_{method}', lambda: score_frame(cleaned, method), repeat)
+        scored[key] = _measure(results, rows, f'{page}_combine', lambda: combine_scores(cleaned, scores), repeat)
+    page1_scored = scored['page1_data']
+    page2_scored = scored['page2_data']
+
+    rankings = _measure(results, rows, 'page1_ranking_index', lambda: RankingIndex(page1_scored), repeat)
+    _measure(results, rows, 'page1_topk', lambda: [rankings.top(metric, 10) for metric in rankings.metrics], repeat)
+    _measure(results, rows, 'page1_industry_groupby',
+             lambda: page1_scored.groupby('業種', observed=True)[SCORE_COLUMNS].mean(), repeat)
+
+    history = _measure(results, rows, 'page1_history', lambda: HistoryStore(datasets['page1_data']), repeat)
+    _measure(results, rows, 'page1_history_stats', lambda: history.stats('配当金', DIVIDEND_AVERAGE_YEARS), repeat)
+
+    # Page 3: 先頭の5社を保有有価証券として、買い替え先を計算する
+    held = datasets['page1_data'].head(5)
+    held_market_value = float(held['時価'].sum())
+    max_purchase_amount = held_market_value * AFTER_TAX_RATIO
+
+    def sweep():
+        candidates = CandidateSweep(page2_scored, amount_grid(max_purchase_amount, 1000000))
+        return candidates, candidates.frontier()
+
+    _, frontier = _measure(results, rows, 'page3_sweep', sweep, repeat)
+    candidates = page2_scored.head(OPTIMIZER_CANDIDATES)
+    _measure(results, rows, f'page3_optimizer_{len(candidates)}', lambda: optimize_portfolio(
+        candidates, max_purchase_amount, lot_size=100, max_weight=0.3), repeat)
+
+    prices = page2_scored['株価'].to_numpy(dtype=float)
+    dividends = page2_scored['1株当たり配当金'].to_numpy(dtype=float)
+    shares = max_purchase_amount // prices[0]
+    market_values = np.append(held['時価'].to_numpy(dtype=float), shares * prices[0])
+    base_dividends = np.append(latest_dividend(history, np.arange(len(held))), shares * dividends[0])
+    _, mean_dividends = _measure(results, rows, 'page3_montecarlo', lambda: simulate(
+        market_values, base_dividends, np.zeros(len(market_values)), np.full(len(market_values), 0.1),
+        n_paths=SCENARIO_PATHS, seed=0), repeat)
+    outcomes = {'保有': mean_dividends[:, :-1].sum(axis=1), '買い替え後': mean_dividends[:, -1]}
+
+    # グラフは毎回キャッシュを空にして、描画そのものの時間を計測する
+    for chart_type, params in _chart_params(page1_scored, page2_scored, frontier, outcomes).items():
+        def render(chart_type=chart_type, params=params):
+            chart_cache.clear()
+            return render_chart(chart_type, **params)
+
+        _measure(results, rows, f'chart_{chart_type}', render, repeat)
+        _measure(results, rows, f'vega_{chart_type}', lambda: json.dumps(chart_spec(chart_type, **params), ensure_ascii=False), repeat)
+    return results
+
+
+def compare(results, previous, threshold=REGRESSION_THRESHOLD):
+    """前回の結果と比べて、遅くなった段階を返す。"""
+    before = {(r['rows'], r['stage']): r for r in previous['results']}
+    regressions = []
+    print(f"\n{'rows':>9} {'stage':<32} {'before':>10} {'after':>10} {'ratio':>7}")
+    for r in results:
+        old = before.get((r['rows'], r['stage']))
+        if old is None or not old['min_ms']:
+            continue
+        ratio = r['min_ms'] / old['min_ms']
+        regressed = ratio > 1 + threshold and r['min_ms'] - old['min_ms'] >= MIN_REGRESSION_MS
+        mark = '  <-- 低下' if regressed else ''
+        print(f"{r['rows']:>9,} {r['stage']:<32} {old['min_ms']:>10.1f} {r['min_ms']:>10.1f} {ratio:>7.2f}{mark}")
+        if regressed:
+            regressions.append({**r, 'before_ms': old['min_ms'], 'ratio': round(ratio, 3)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="各ページの処理を段階ごとに計測する")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help="ワークブックの行数（100〜1000000）")
+    parser.add_argument('--repeat', type=int, default=3, help="読み込み以外の段階の繰り返し回数")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--missing', type=float, default=0.01, help="空欄にする指標の割合")
+    parser.add_argument('--workbook-dir', default=DEFAULT_WORKBOOK_DIR, help="作成したワークブックの保存先（次回も使い回す）")
+    parser.add_argument('--output', help="結果を保存する JSON ファイル")
+    parser.add_argument('--compare', help="比較する前回の結果の JSON ファイル")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help="性能の低下とみなす遅くなった割合")
+    args = parser.parse_args(argv)
+
+    # フォントにない文字などの描画の警告は計測結果の表示の邪魔になるため出さない
+    warnings.simplefilter('ignore', UserWarning)
+
+    os.makedirs(args.workbook_dir, exist_ok=True)
+    results = []
+    for rows in args.rows:
+        path = os.path.join(args.workbook_dir, f'synthetic_{rows}_{args.seed}_{args.missing}.xlsx')
+        if not os.path.exists(path):
+            print(f"ワークブックを作成しています: {path}", flush=True)
+            make_workbook(path, rows, args.seed, args.missing)
+        results += bench_workbook(path, rows, args.repeat)
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': {'pandas': pd.__version__, 'numpy': np.__version__, 'matplotlib': matplotlib.__version__},
+        'repeat': args.repeat,
+        'results': results,
+    }
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        report['regressions'] = regressions
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    # 性能が低下した段階があれば終了コード 1 を返す（CI で検出できるように）
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
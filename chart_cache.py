@@ -0,0 +1,70 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# キャッシュするグラフ画像の合計サイズの上限（環境変数で変更可能）
+MAX_CHART_CACHE_BYTES = int(os.environ.get('CHART_CACHE_MAX_MB', '64')) * 1024 * 1024
+
+
+def _normalize(value):
+    # numpy や pandas の値もキーとして比較できる形にそろえる
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    return value
+
+
+def chart_key(chart_type, fmt, params):
+    payload = json.dumps([chart_type, fmt, _normalize(params)], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ChartCache:
+    # 描画済みのグラフ画像を、合計サイズの上限付きで新しく使われた順に保持する
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self.size -= len(self._items.pop(key))
+            self._items[key] = data
+            self.size += len(data)
+            # 上限を超えたら、最後に使われたのが古いものから削除する
+            while self.size > self.max_bytes:
+                _, old = self._items.popitem(last=False)
+                self.size -= len(old)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._items)
+
+
+chart_cache = ChartCache(MAX_CHART_CACHE_BYTES)
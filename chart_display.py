@@ -0,0 +1,40 @@
+import json
+import os
+import time
+
+import streamlit as st
+
+from perf import record_chart
+
+# グラフの描画方式（サイドバーの表示名 → 内部の名前）
+BACKENDS = {
+    "サーバー (matplotlib)": 'matplotlib',
+    "ブラウザ (Vega-Lite)": 'vega',
+}
+DEFAULT_BACKEND = os.environ.get('CHART_BACKEND', 'matplotlib')
+
+
+def select_backend():
+    labels = list(BACKENDS)
+    default_index = list(BACKENDS.values()).index(DEFAULT_BACKEND) if DEFAULT_BACKEND in BACKENDS.values() else 0
+    label = st.sidebar.selectbox("グラフの描画方式", labels, index=default_index)
+    st.session_state['chart_backend'] = BACKENDS[label]
+
+
+def show_chart(chart_type, **params):
+    # 選択された描画方式でグラフを表示し、処理時間と送信サイズを記録する
+    backend = st.session_state.get('chart_backend', DEFAULT_BACKEND)
+    start = time.perf_counter()
+    if backend == 'vega':
+        from vega_charts import chart_spec
+
+        spec = chart_spec(chart_type, **params)
+        payload_bytes = len(json.dumps(spec, ensure_ascii=False).encode('utf-8'))
+        st.vega_lite_chart(spec=spec)
+    else:
+        from charts import render_chart
+
+        image = render_chart(chart_type, **params)
+        payload_bytes = len(image)
+        st.image(image, width='stretch')
+    record_chart(backend, chart_type, (time.perf_counter() - start) * 1000, payload_bytes)
@@ -0,0 +1,278 @@
+import io
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from chart_cache import chart_cache, chart_key
+from fonts import font_prop
+
+# st.pyplot と同じ保存設定
+SAVEFIG_OPTIONS = {'bbox_inches': 'tight', 'dpi': 200}
+
+# 使い回すレーダーチャートの Figure の数の上限
+MAX_POOLED_FIGURES = 8
+
+# matplotlib はスレッドセーフではないため、描画は1つずつ行う
+_render_lock = threading.Lock()
+_figure_pool = OrderedDict()
+
+
+def _new_figure(figsize=None):
+    # pyplot を経由せずに作成した Figure は pyplot の管理対象にならず、参照がなくなれば解放される
+    from matplotlib.figure import Figure
+
+    return Figure(figsize=figsize)
+
+
+def _radar_angles(categories):
+    import numpy as np
+
+    angles = np.linspace(0, 2 * np.pi, len(categories), endpoint=False).tolist()
+    angles += angles[:1]
+    return angles
+
+
+class RadarAxes:
+    # 1つの極座標軸の上にある企業ごとの線・塗りつぶし・スコア表示を保持し、データだけを差し替える
+
+    def __init__(self, ax, categories):
+        self.ax = ax
+        self.angles = _radar_angles(categories)
+        self.series = []
+
+        prop = font_prop()
+        ax.set_yticklabels([])
+        ax.set_xticks(self.angles[:-1])
+        ax.set_xticklabels(categories, fontproperties=prop)
+
+    def update(self, data, titles, linewidth, color=None):
+        prop = font_prop()
+
+        # 企業数が減った分の線を削除する
+        while len(self.series) > len(data):
+            line, fill, texts = self.series.pop()
+            line.remove()
+            fill.remove()
+            for text in texts:
+                text.remove()
+
+        for idx, d in enumerate(data):
+            values = list(d)
+            values += values[:1]
+            series_color = color or f'C{idx % 10}'
+
+            if idx < len(self.series):
+                line, fill, texts = self.series[idx]
+                line.set_data(self.angles, values)
+                fill.set_xy(list(zip(self.angles, values)))
+            else:
+                line, = self.ax.plot(self.angles, values, linestyle='solid')
+                fill, = self.ax.fill(self.angles, values, alpha=0.25)
+                # スコアの表示
+                texts = [self.ax.text(angle, 0, '', horizontalalignment='center', size=12, color='black', fontproperties=prop)
+                         for angle in self.angles]
+                self.series.append((line, fill, texts))
+
+            line.set_label(titles[idx])
+            line.set_linewidth(linewidth)
+            line.set_color(series_color)
+            fill.set_facecolor(series_color)
+            fill.set_edgecolor(series_color)
+            for text, angle, value in zip(texts, self.angles, values):
+                text.set_position((angle, value * 1.1))
+                text.set_text(str(value))
+
+        self.ax.relim()
+        self.ax.autoscale_view()
+
+
+class RadarFigure:
+    # 1つのレーダーチャートに複数の企業を重ねて表示する Figure
+
+    def __init__(self, categories, chart_size):
+        self.fig = _new_figure(chart_size)
+        self.radar = RadarAxes(self.fig.add_subplot(polar=True), categories)
+
+    def update(self, data, titles, label_size, linewidth):
+        self.radar.update(data, titles, linewidth)
+        legend = self.radar.ax.get_legend()
+        if legend is not None:
+            legend.remove()
+        self.radar.ax.legend(loc='upper right', bbox_to_anchor=(1.3, 1.3), prop=font_prop(), fontsize=label_size)
+        return self.fig
+
+
+class SideBySideRadarFigure:
+    # 企業ごとのレーダーチャートを2列に並べて表示する Figure
+
+    def __init__(self, categories, chart_size, num_charts):
+        num_rows = (num_charts + 1) // 2  # 列数を2に設定
+        self.fig = _new_figure((chart_size[0] * 2, chart_size[1] * num_rows * 1.5))
+        axes = self.fig.subplots(num_rows, 2, subplot_kw=dict(polar=True))
+        self.radars = []
+        for idx, ax in enumerate(axes.flat):
+            if idx < num_charts:
+                self.radars.append(RadarAxes(ax, categories))
+            else:
+                ax.axis('off')
+
+    def update(self, data, titles):
+        prop = font_prop()
+        for radar, values, title in zip(self.radars, data, titles):
+            radar.update([values], [title], linewidth=2, color='blue')
+            radar.ax.set_title(f"{title} (合計スコア: {round(sum(values), 2)})", size=20, fontproperties=prop, pad=30)
+        self.fig.tight_layout(pad=5.0)  # レイアウトのパディングを増やしてスペースを広げる
+        return self.fig
+
+
+def _pooled_figure(key, factory):
+    # 同じレイアウトの Figure があれば使い回す（古いものから破棄する）
+    figure = _figure_pool.get(key)
+    if figure is None:
+        figure = factory()
+        _figure_pool[key] = figure
+        while len(_figure_pool) > MAX_POOLED_FIGURES:
+            _figure_pool.popitem(last=False)
+    else:
+        _figure_pool.move_to_end(key)
+    return figure
+
+
+# 同じレーダーチャートに複数の企業のデータを重ねて表示する
+def draw_radar_multiple(data, categories, titles, chart_size, label_size, linewidth=1.5):
+    key = ('radar_multiple', tuple(categories), tuple(chart_size))
+    figure = _pooled_figure(key, lambda: RadarFigure(categories, chart_size))
+    return figure.update(data, titles, label_size, linewidth)
+
+
+# 横並びにレーダーチャートを表示する
+def draw_radar_side_by_side(data, categories, titles, chart_size):
+    key = ('radar_side_by_side', tuple(categories), tuple(chart_size), len(data))
+    figure = _pooled_figure(key, lambda: SideBySideRadarFigure(categories, chart_size, len(data)))
+    return figure.update(data, titles)
+
+
+# 企業ごとの棒グラフ（series は (値のリスト, 凡例, 色) のリスト）
+def draw_bar_chart(labels, series, xlabel, ylabel, title):
+    import numpy as np
+
+    fig = _new_figure((10, 6))
+    ax = fig.add_subplot()
+    index = np.arange(len(labels))
+    bar_width = 0.35
+
+    prop = font_prop()
+
+    bar_groups = []
+    for i, (values, label, color) in enumerate(series):
+        bar_groups.append(ax.bar(index + bar_width * i, values, bar_width, alpha=0.8, label=label, color=color))
+
+    ax.set_xlabel(xlabel, fontproperties=prop)
+    ax.set_ylabel(ylabel, fontproperties=prop)
+    ax.set_title(title, fontproperties=prop)
+    ax.set_xticks(index + bar_width * (len(series) - 1) / 2)
+    ax.set_xticklabels(labels, rotation=45, fontproperties=prop)
+    ax.legend(prop=prop)  # フォントプロパティを設定
+
+    # データラベルを追加
+    for bars in bar_groups:
+        for bar in bars:
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width() / 2, height, f'{height:,.0f}', ha='center', va='bottom', fontproperties=prop)
+
+    fig.tight_layout()
+    return fig
+
+
+# 保有有価証券と買い替え先の比較（Page 3）
+def draw_comparison_bar(labels, values, ylabel, tick_step=None):
+    import matplotlib.ticker as ticker
+
+    fig = _new_figure()
+    ax = fig.add_subplot()
+
+    prop = font_prop()
+
+    bars = ax.bar(range(len(labels)), values, color=['blue', 'green'])
+    ax.set_ylabel(ylabel, fontproperties=prop)
+    ax.set_xticks(range(len(labels)))
+    ax.set_xticklabels(labels, fontproperties=prop)
+    if tick_step:
+        ax.yaxis.set_major_locator(ticker.MultipleLocator(tick_step))
+        ax.yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f'{x:,.0f}'))
+    for bar in bars:
+        height = bar.get_height()
+        ax.annotate(f'{height:,.0f}', xy=(bar.get_x() + bar.get_width() / 2, height),
+                    xytext=(0, 3), textcoords="offset points", ha='center', va='bottom', fontproperties=prop)
+    return fig
+
+
+# 買い替え後の時価と配当金の効率的な組み合わせ（Page 3）
+def draw_frontier(market_values, dividends, labels):
+    import matplotlib.ticker as ticker
+
+    fig = _new_figure((8, 5))
+    ax = fig.add_subplot()
+
+    prop = font_prop()
+
+    ax.plot([value / 1e6 for value in market_values], dividends, marker='o', markersize=3, color='green')
+    # 買い替え先が切り替わる点に企業名を表示する
+    for i, label in enumerate(labels):
+        if i == 0 or label != labels[i - 1]:
+            ax.annotate(label, xy=(market_values[i] / 1e6, dividends[i]), xytext=(3, 3), textcoords="offset points", fontproperties=prop)
+    ax.set_xlabel('買い替え後の時価（百万円）', fontproperties=prop)
+    ax.set_ylabel('推定配当金（円）', fontproperties=prop)
+    ax.yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f'{x:,.0f}'))
+    ax.grid(alpha=0.3)
+    fig.tight_layout()
+    return fig
+
+
+# シナリオごとの結果の分布（series は (区間ごとの件数, 凡例, 色) のリスト）
+def draw_histogram(edges, series, xlabel):
+    fig = _new_figure((8, 4))
+    ax = fig.add_subplot()
+
+    prop = font_prop()
+
+    for counts, label, color in series:
+        ax.stairs(counts, edges, fill=True, alpha=0.4, color=color, label=label)
+    ax.set_xlabel(xlabel, fontproperties=prop)
+    ax.set_ylabel('シナリオの数', fontproperties=prop)
+    ax.legend(prop=prop)
+    fig.tight_layout()
+    return fig
+
+
+CHARTS = {
+    'radar_multiple': draw_radar_multiple,
+    'radar_side_by_side': draw_radar_side_by_side,
+    'bar': draw_bar_chart,
+    'comparison_bar': draw_comparison_bar,
+    'frontier': draw_frontier,
+    'histogram': draw_histogram,
+}
+
+
+@contextmanager
+def rendered_figure(chart_type, **params):
+    # グラフを描画した Figure を with ブロックの中でだけ使う
+    # レーダーチャートの Figure は使い回しているため、ブロックを抜けるまで他のスレッドは描画できない
+    with _render_lock:
+        yield CHARTS[chart_type](**params)
+
+
+def render_chart(chart_type, fmt='png', **params):
+    # 入力が同じグラフは描画し直さず、キャッシュした画像を返す
+    key = chart_key(chart_type, fmt, params)
+    data = chart_cache.get(key)
+    if data is not None:
+        return data
+
+    buf = io.BytesIO()
+    with rendered_figure(chart_type, **params) as fig:
+        fig.savefig(buf, format=fmt, **SAVEFIG_OPTIONS)
+    data = buf.getvalue()
+    chart_cache.put(key, data)
+    return data
@@ -0,0 +1,37 @@
+import pandas as pd
+
+from history import year_columns
+
+# 数値として扱う列（Page 2）
+PAGE2_NUMERIC_COLUMNS = ['自己資本比率', 'ROE', 'ROA', 'PER', 'PBR', '配当利回り', '株価', '1株当たり配当金', '購入株数']
+
+
+def clean_page1(df):
+    df = df.copy()
+
+    # 配当利回りの過去データを削除（年度ごとの推移は HistoryStore で扱う）
+    df = df.drop(columns=list(year_columns(df.columns, '配当利回り').values()))
+
+    # 配当利回りの値に100を掛けてパーセンテージ表示に変換し、小数点第2位まで四捨五入
+    if '配当利回り' in df.columns:
+        df['配当利回り'] = (df['配当利回り'] * 100).round(2)
+    return df
+
+
+def clean_page2(df):
+    df = df.copy()
+
+    # 必要な列を数値型に変換
+    for col in PAGE2_NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # A〜H列の処理（Page1と同様）
+    df['配当利回り'] = (df['配当利回り'] * 100).round(2)
+    return df
+
+
+# セッションのキーごとの前処理
+CLEANERS = {
+    'page1_data': clean_page1,
+    'page2_data': clean_page2,
+}
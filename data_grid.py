@@ -0,0 +1,120 @@
+# 大きな表をサーバー側で絞り込み・並べ替え・ページ分割し、表示するページの行だけをブラウザに送る
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from memory import SESSION_CACHE_PREFIX
+
+PAGE_SIZES = [25, 50, 100, 200]
+DEFAULT_PAGE_SIZE = 50
+
+# 部分一致で検索する列と、値を選んで絞り込む列
+SEARCH_COLUMN = '企業名'
+GROUP_COLUMN = '業種'
+
+
+def numeric_columns(df):
+    return [column for column in df.columns
+            if pd.api.types.is_numeric_dtype(df[column].dtype) and not pd.api.types.is_bool_dtype(df[column].dtype)]
+
+
+def grid_positions(df, search='', groups=None, range_column=None, low=None, high=None, sort_column=None,
+                   ascending=True):
+    # 条件に合う行の位置（iloc の位置）を表示する順に返す
+    mask = np.ones(len(df), dtype=bool)
+    if search and SEARCH_COLUMN in df.columns:
+        mask &= df[SEARCH_COLUMN].astype(str).str.contains(search, case=False, regex=False).to_numpy(dtype=bool)
+    if groups and GROUP_COLUMN in df.columns:
+        mask &= df[GROUP_COLUMN].isin(groups).to_numpy()
+    if range_column in df.columns and (low is not None or high is not None):
+        values = pd.to_numeric(df[range_column], errors='coerce').to_numpy(dtype=float)
+        # 欠損値は範囲を指定したときは含めない
+        with np.errstate(invalid='ignore'):
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+    positions = np.flatnonzero(mask)
+
+    if sort_column in df.columns:
+        # 欠損値は最後に並べる。同じ値は元の行の順
+        values = df[sort_column].iloc[positions].reset_index(drop=True)
+        order = values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+        positions = positions[order]
+    return positions
+
+
+def _cached_positions(df, key, conditions):
+    # 条件が変わらなければ前回の結果を使う（ページを移動しただけでは絞り込み・並べ替えをやり直さない）
+    # 再計算できる値のため、セッションのメモリ使用量が上限を超えたら破棄してよい
+    cache_key = f'{SESSION_CACHE_PREFIX}{key}_positions'
+    # 2つ目の戻り値は条件が変わったか（データだけが変わった場合は表示中のページをそのままにする）
+    cached = st.session_state.get(cache_key)
+    same_conditions = cached is not None and cached[1] == conditions
+    if same_conditions and cached[0] is df:
+        return cached[2], False
+    positions = grid_positions(df, **conditions)
+    st.session_state[cache_key] = (df, conditions, positions)
+    return positions, not same_conditions
+
+
+@st.fragment
+def show_grid(df, key, columns=None, formats=None):
+    """
+    df を表で表示する。絞り込み・並べ替え・列の選択はサーバー側で行い、ブラウザには表示するページの行だけを送る。
+    columns: 最初に表示する列（None は全ての列）
+    formats: {列: 書式}（表示するページの行だけに適用する）
+    """
+    with st.expander("絞り込み・並べ替え"):
+        left, right = st.columns(2)
+        search = left.text_input(f"{SEARCH_COLUMN}で検索", key=f'{key}_search') if SEARCH_COLUMN in df.columns else ''
+        groups = None
+        if GROUP_COLUMN in df.columns:
+            groups = right.multiselect(GROUP_COLUMN, sorted(df[GROUP_COLUMN].dropna().unique(), key=str),
+                                       key=f'{key}_groups')
+
+        numbers = numeric_columns(df)
+        range_column, low, high = None, None, None
+        if numbers:
+            left, middle, right = st.columns(3)
+            range_column = left.selectbox("値で絞り込む列", [None] + numbers, key=f'{key}_range_column',
+                                          format_func=lambda column: "なし" if column is None else str(column))
+            if range_column is not None:
+                low = middle.number_input("最小値", value=None, key=f'{key}_low')
+                high = right.number_input("最大値", value=None, key=f'{key}_high')
+
+        left, right = st.columns(2)
+        sort_column = left.selectbox("並べ替える列", [None] + list(df.columns), key=f'{key}_sort',
+                                     format_func=lambda column: "元の順" if column is None else str(column))
+        ascending = right.radio("順序", [True, False], key=f'{key}_ascending', horizontal=True,
+                                format_func=lambda value: "昇順" if value else "降順")
+
+        shown_columns = st.multiselect("表示する列", list(df.columns),
+                                       default=list(df.columns) if columns is None else columns,
+                                       key=f'{key}_columns')
+
+    conditions = dict(search=search, groups=tuple(groups or ()), range_column=range_column, low=low, high=high,
+                      sort_column=sort_column, ascending=ascending)
+    positions, changed = _cached_positions(df, key, conditions)
+
+    left, right = st.columns(2)
+    page_size = right.selectbox("1ページの行数", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE),
+                                key=f'{key}_page_size')
+    pages = max(1, -(-len(positions) // page_size))
+    page_key = f'{key}_page'
+    # 条件が変わったら最初のページに戻す
+    if changed or st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = 1
+    page = left.number_input(f"ページ（全 {pages} ページ）", min_value=1, max_value=pages, key=page_key)
+
+    start = (page - 1) * page_size
+    page_positions = positions[start:start + page_size]
+    page_df = df.iloc[page_positions][shown_columns or list(df.columns)]
+    if formats:
+        page_df = page_df.style.format({column: column_format for column, column_format in formats.items()
+                                        if column in page_df.columns}, na_rep='-')
+    st.dataframe(page_df)
+    if len(positions):
+        st.caption(f"{len(positions):,} 件中 {start + 1:,}〜{start + len(page_positions):,} 件目（全 {len(df):,} 件）")
+    else:
+        st.caption(f"条件に合う行はありません（全 {len(df):,} 件）")
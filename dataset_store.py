@@ -0,0 +1,136 @@
+# 全てのセッションで共有する、読み込み済み・スコア計算済みのデータ
+# 同じ内容のワークブックは1回だけ読み込み、各セッションは同じオブジェクトを参照する
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from types import MappingProxyType
+
+from memory import estimate_bytes
+
+# プロセス全体で保持するデータの上限（参照しているセッションがないものから破棄する）
+MAX_STORE_BYTES = int(float(os.environ.get('DATASET_STORE_MAX_MB', 1024)) * 1024 * 1024)
+
+# 参照しているセッションのデータだけで上限を超える場合は、この秒数使われていない派生データ（再計算できる）を破棄する
+# 使用中の段階は破棄しないため、どのセッションも再実行のたびに計算し直すことはない
+STAGE_IDLE_SECONDS = float(os.environ.get('DATASET_STORE_IDLE_SECONDS', 60))
+
+
+class DatasetEntry:
+    # 1つのワークブックから作ったデータと派生データ（共有するため変更しない）
+
+    def __init__(self, digest, datasets, derived):
+        self.digest = digest
+        self.datasets = MappingProxyType(dict(datasets))
+        self.derived = derived
+        self._handles = weakref.WeakSet()
+
+    @property
+    def refs(self):
+        return len(self._handles)
+
+    @property
+    def size(self):
+        seen = set()
+        size = estimate_bytes(dict(self.datasets), seen)
+        for _, values in self.derived.results():
+            size += estimate_bytes(values, seen)
+        return size
+
+    def stage_sizes(self):
+        # 派生データの段階ごとのバイト数（読み込んだデータと共有している配列は数えない）
+        seen = set()
+        estimate_bytes(dict(self.datasets), seen)
+        return {name: estimate_bytes(values, seen) for name, values in self.derived.results()}
+
+
+class DatasetHandle:
+    # セッションが共有データを参照していることを表す
+    # セッションが破棄されてこのオブジェクトが解放されると、参照も自動的に外れる
+
+    def __init__(self, entry):
+        self.entry = entry
+        entry._handles.add(self)
+
+    @property
+    def digest(self):
+        return self.entry.digest
+
+    def session_values(self):
+        # session_state に入れる値（データはコピーせず、共有のオブジェクトをそのまま参照する）
+        return {'workbook_digest': self.entry.digest, **self.entry.datasets, 'derived': self.entry.derived,
+                'dataset_handle': self}
+
+
+class DatasetStore:
+
+    def __init__(self, max_bytes=MAX_STORE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, digest):
+        # 同じ内容のデータがあれば参照を返す（なければ None）
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            self._entries.move_to_end(digest)
+            return DatasetHandle(entry)
+
+    def put(self, digest, datasets, derived):
+        # 同時に同じファイルが読み込まれた場合は、先に登録されたデータを使う
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                entry = DatasetEntry(digest, datasets, derived)
+                self._entries[digest] = entry
+            self._entries.move_to_end(digest)
+            handle = DatasetHandle(entry)
+            self._evict()
+            return handle
+
+    def _evict(self):
+        # 上限を超えている間、参照しているセッションがない古いデータから破棄する
+        sizes = {digest: entry.size for digest, entry in self._entries.items()}
+        total = sum(sizes.values())
+        for digest in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if self._entries[digest].refs == 0:
+                del self._entries[digest]
+                total -= sizes[digest]
+        if total > self.max_bytes:
+            self._evict_idle_stages(total - self.max_bytes)
+
+    def _evict_idle_stages(self, excess):
+        # しばらく使われていない派生データを、最後に使われた時刻が古い順に破棄する
+        now = time.monotonic()
+        stages = []
+        for entry in self._entries.values():
+            for name, size in entry.stage_sizes().items():
+                last_used = entry.derived.last_used(name)
+                if now - last_used >= STAGE_IDLE_SECONDS:
+                    stages.append((last_used, size, name, entry))
+        freed = 0
+        for _, size, name, entry in sorted(stages, key=lambda stage: stage[0]):
+            if freed >= excess:
+                break
+            entry.derived.evict(name)
+            freed += size
+        return freed
+
+    def evict(self):
+        # 上限を超えていれば破棄する（データが増えるのは読み込み時だけではないため、定期的に呼び出す）
+        with self._lock:
+            self._evict()
+
+    def summary(self):
+        # (件数, 合計バイト数, 参照しているセッション数の合計)
+        with self._lock:
+            entries = list(self._entries.values())
+        return len(entries), sum(entry.size for entry in entries), sum(entry.refs for entry in entries)
+
+
+dataset_store = DatasetStore()
@@ -0,0 +1,148 @@
+# 前回アップロードしたデータとの行ごとの差分（企業ごとに行のハッシュを比べる）と、差分だけを使った派生データの更新
+import numpy as np
+import pandas as pd
+
+from scoring import score_frame
+
+# 変更した行がこの割合を超えたら、差分だけを更新せずに全て計算し直す
+PATCH_MAX_FRACTION = 0.2
+
+CHANGE_COLUMNS = ['企業名', '変更', '変更した列', '合計スコア（前）', '合計スコア（後）', '差']
+
+
+def row_keys(df):
+    # 企業名と、同じ企業名の中での出現順で行を対応させる（同名の企業が複数あっても一意になる）
+    names = df['企業名'].astype(str).reset_index(drop=True)
+    return (names + '#' + names.groupby(names).cumcount().astype(str)).to_numpy()
+
+
+def _normalized(df):
+    # 読み込むたびに型が変わっても同じ値は同じハッシュになるよう、数値は float、それ以外は文字列にそろえる
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_numeric_dtype(series.dtype) and not isinstance(series.dtype, pd.CategoricalDtype):
+            columns[column] = pd.to_numeric(series, errors='coerce').astype(float)
+        else:
+            columns[column] = series.astype(object).where(series.notna(), None).astype(str)
+    return pd.DataFrame(columns).reset_index(drop=True)
+
+
+def row_hashes(df):
+    return pd.util.hash_pandas_object(_normalized(df), index=False).to_numpy()
+
+
+class RowDelta:
+    # 前回と今回のデータの行の対応（位置はいずれも iloc の位置）
+
+    def __init__(self, old_df, new_df):
+        self.same_columns = list(old_df.columns) == list(new_df.columns)
+        self.old_keys = row_keys(old_df)
+        self.new_keys = row_keys(new_df)
+        # 列が変わった場合は全ての行を変更したものとして扱う
+        old_hashes = row_hashes(old_df) if self.same_columns else np.zeros(len(old_df), dtype=np.uint64)
+        new_hashes = row_hashes(new_df) if self.same_columns else np.ones(len(new_df), dtype=np.uint64)
+
+        new_positions = pd.Index(self.new_keys).get_indexer(self.old_keys)
+        matched = new_positions >= 0
+        same = matched.copy()
+        same[matched] = old_hashes[matched] == new_hashes[new_positions[matched]]
+
+        self.removed = np.flatnonzero(~matched)
+        self.modified_old = np.flatnonzero(matched & ~same)
+        self.modified_new = new_positions[self.modified_old]
+        present = np.zeros(len(new_df), dtype=bool)
+        present[new_positions[matched]] = True
+        self.added = np.flatnonzero(~present)
+
+        # 変更のない行だけの 元の位置 → 新しい位置（それ以外は -1）
+        self.old_to_new = np.where(same, new_positions, -1)
+        self.changed = np.sort(np.concatenate([self.modified_new, self.added])).astype(np.intp)
+        self.size = len(new_df)
+
+    @property
+    def empty(self):
+        return not (len(self.removed) or len(self.changed))
+
+    @property
+    def order_kept(self):
+        # 変更のない行の並び順が前回と同じか（並べ替えられていると索引の順序を引き継げない）
+        kept = self.old_to_new[self.old_to_new >= 0]
+        return bool(np.all(np.diff(kept) > 0))
+
+    @property
+    def patchable(self):
+        return (self.same_columns and len(self.changed) + len(self.removed) <= PATCH_MAX_FRACTION * max(self.size, 1))
+
+
+def patch_scores(old_scores, cleaned, delta):
+    # 変更のない行は前回のスコアをそのまま使い、変更・追加した行だけをスコア計算する
+    kept = delta.old_to_new >= 0
+    parts = [old_scores.iloc[np.flatnonzero(kept)].set_axis(cleaned.index[delta.old_to_new[kept]])]
+    if len(delta.changed):
+        parts.append(score_frame(cleaned.iloc[delta.changed]))
+    return pd.concat(parts).reindex(cleaned.index)
+
+
+def patch_derived(derived, previous, page, delta):
+    """
+    前回の派生データのうち計算済みのものを差分だけで更新して derived に登録する。
+    更新した段階の名前を返す。
+    """
+    patched = []
+    old_scores = previous.cached(f'{page}_scores')
+    if old_scores is None:
+        return patched
+    cleaned = derived.get(f'{page}_cleaned')
+    derived.put(f'{page}_scores', patch_scores(old_scores, cleaned, delta))
+    patched.append(f'{page}_scores')
+
+    if page != 'page1':
+        return patched
+    rankings = previous.cached('page1_rankings')
+    if rankings is not None and delta.order_kept:
+        derived.put('page1_rankings', rankings.patched(cleaned, delta.old_to_new, delta.changed))
+        patched.append('page1_rankings')
+
+    cube = previous.cached('page1_industry_cube')
+    if cube is not None:
+        scored = derived.get('page1_scored')
+        cube = cube.copy()
+        # 業種別の集計は企業ごとのキーで行を対応させている
+        cube.update(scored.iloc[delta.changed].set_axis(delta.new_keys[delta.changed]),
+                    removed=delta.old_keys[delta.removed])
+        derived.put('page1_industry_cube', cube)
+        patched.append('page1_industry_cube')
+    return patched
+
+
+def _changed_columns(old_df, new_df, delta):
+    # 変更した行ごとの値が変わった列
+    if not len(delta.modified_old) or not delta.same_columns:
+        return [''] * len(delta.modified_old)
+    old = _normalized(old_df.iloc[delta.modified_old])
+    new = _normalized(new_df.iloc[delta.modified_new])
+    differs = ~((old.to_numpy() == new.to_numpy()) | (old.isna().to_numpy() & new.isna().to_numpy()))
+    columns = np.asarray(old.columns)
+    return [', '.join(map(str, columns[row])) for row in differs]
+
+
+def change_summary(old_df, new_df, old_scored, new_scored, delta):
+    """追加・削除・変更した企業と合計スコアの変化の表を返す。"""
+    old_total = pd.to_numeric(old_scored['合計スコア'], errors='coerce').to_numpy(dtype=float)
+    new_total = pd.to_numeric(new_scored['合計スコア'], errors='coerce').to_numpy(dtype=float)
+    names = new_df['企業名'].astype(str).to_numpy()
+    old_names = old_df['企業名'].astype(str).to_numpy()
+    parts = [
+        pd.DataFrame({'企業名': names[delta.added], '変更': '追加', '変更した列': '',
+                      '合計スコア（前）': np.nan, '合計スコア（後）': new_total[delta.added]}),
+        pd.DataFrame({'企業名': old_names[delta.removed], '変更': '削除', '変更した列': '',
+                      '合計スコア（前）': old_total[delta.removed], '合計スコア（後）': np.nan}),
+        pd.DataFrame({'企業名': names[delta.modified_new], '変更': '変更',
+                      '変更した列': _changed_columns(old_df, new_df, delta),
+                      '合計スコア（前）': old_total[delta.modified_old], '合計スコア（後）': new_total[delta.modified_new]}),
+    ]
+    summary = pd.concat([part for part in parts if len(part)], ignore_index=True) if not delta.empty else pd.DataFrame()
+    summary = summary.reindex(columns=CHANGE_COLUMNS)
+    summary['差'] = summary['合計スコア（後）'] - summary['合計スコア（前）']
+    return summary
@@ -0,0 +1,206 @@
+# 読み込んだデータから作る派生データ（前処理・スコア・ランキング・業種別平均など）の依存関係と計算結果
+# 入力のデータのバージョン（ワークブックの内容のハッシュ）と引数が変わった段階だけを計算し直す
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from cleaning import CLEANERS
+from delta import row_keys
+from history import HistoryStore
+from indexes import RANKING_METRICS, CompanyIndex, IndustryCube, RankingIndex
+from optimizer import optimize_portfolio
+from scoring import SCORE_COLUMNS, combine_scores, score_frame
+from simulation import CandidateSweep, amount_grid
+
+# 段階の名前 → (関数, 入力の段階, {関数に渡す引数の名前: 省略時の値})
+STAGES = {}
+
+# 段階ごとに保持する計算結果の数（引数の異なる結果を複数のセッションで使い回すため）
+MAX_RESULTS_PER_STAGE = 4
+
+# 読み込み時にバックグラウンドで計算しておく段階
+WARM_STAGES = ['page1_scored', 'page1_companies', 'page1_rankings', 'page1_history', 'page2_scored', 'page2_companies']
+
+
+def stage(name, deps, params=()):
+    # params は引数の名前のリスト、または {引数の名前: 省略時の値}
+    def register(func):
+        STAGES[name] = (func, list(deps), dict(params) if isinstance(params, dict) else dict.fromkeys(params))
+        return func
+    return register
+
+
+for _key, _page in [('page1_data', 'page1'), ('page2_data', 'page2')]:
+    stage(f'{_page}_cleaned', [_key])(CLEANERS[_key])
+    stage(f'{_page}_scores', [f'{_page}_cleaned'], params={'scoring_method': 'absolute'})(score_frame)
+    stage(f'{_page}_scored', [f'{_page}_cleaned', f'{_page}_scores'], params={'weights': None})(combine_scores)
+    # 企業名の索引（前処理では行の順序は変わらないため、元のデータやスコアを追加したデータにもそのまま使える）
+    # スコアの計算方法によらないため、前処理済みのデータから作る
+    stage(f'{_page}_companies', [f'{_page}_cleaned'])(CompanyIndex)
+
+
+@stage('page1_rankings', ['page1_cleaned'])
+def _rankings(cleaned):
+    return RankingIndex(cleaned)
+
+
+@stage('page1_history', ['page1_data'])
+def _history(data):
+    # 配当金・配当利回りの年度ごとの推移（前処理で削除する前の列から作る）
+    return HistoryStore(data)
+
+
+@stage('page1_industry_cube', ['page1_scored'])
+def _industry_cube(scored):
+    # スコアと元の指標の業種別の集計値（差分で更新できるよう、行は企業ごとのキーで対応させる）
+    return IndustryCube(scored.set_axis(row_keys(scored)), SCORE_COLUMNS + RANKING_METRICS)
+
+
+@stage('page1_history_stats', ['page1_history'], params={'metric': '配当金', 'window': None})
+def _history_stats(history, metric, window):
+    stats = history.stats(metric, window)
+    stats.insert(0, '企業名', history.names)
+    return stats
+
+
+@stage('candidate_sweep', ['page2_scored'], params=['max_purchase_amount', 'step'])
+def _candidate_sweep(scored, max_purchase_amount, step):
+    return CandidateSweep(scored, amount_grid(max_purchase_amount, step))
+
+
+@stage('portfolio', ['page2_scored'],
+       params={'budget': 0, 'lot_size': 1, 'max_weight': 1.0, 'min_score': None, 'industry_caps': ()})
+def _portfolio(scored, budget, lot_size, max_weight, min_score, industry_caps):
+    # 業種ごとの上限はキーに使えるよう ((業種, 上限の割合), ...) で受け取る
+    return optimize_portfolio(scored, budget, lot_size=lot_size, max_weight=max_weight, min_score=min_score,
+                              industry_caps=dict(industry_caps))
+
+
+class DerivedCache:
+    # 段階ごとに最近計算した結果を {入力のバージョンと引数: 値} として保持する
+    # 同じワークブックを開いている全てのセッションで共有する
+
+    def __init__(self):
+        self._sources = {}
+        self._results = {}
+        self._used = {}
+        self.stats = {}
+        # _lock は結果の辞書を読み書きする間だけ持つ。計算中は結果のキーごとのロックだけを持つため、
+        # 同じ結果は1回だけ計算し、別の段階や引数の計算は複数のセッションで同時に進められる
+        self._lock = threading.RLock()
+        self._key_locks = {}
+
+    def set_source(self, name, version, value):
+        # バージョンが同じ場合は入れ替えず、計算済みの段階をそのまま使う
+        with self._lock:
+            current = self._sources.get(name)
+            if current is None or current[0] != version:
+                self._sources[name] = (version, value)
+
+    def available(self, name):
+        # 段階の入力のデータが全てそろっているか
+        if name in self._sources:
+            return True
+        return name in STAGES and all(self.available(dep) for dep in STAGES[name][1])
+
+    def version(self, name):
+        source = self._sources.get(name)
+        return None if source is None else source[0]
+
+    def _key(self, name, params):
+        if name in self._sources:
+            return (name, self._sources[name][0])
+        _, deps, param_names = STAGES[name]
+        return (name, tuple(self._key(dep, params) for dep in deps),
+                tuple(params.get(p, default) for p, default in param_names.items()))
+
+    def _lookup(self, name, key):
+        # 計算済みならヒットとして数えて (True, 値) を返す（_lock を持って呼び出す）
+        results = self._results.setdefault(name, OrderedDict())
+        self._used[name] = time.monotonic()
+        if key not in results:
+            return False, None
+        results.move_to_end(key)
+        self._stats(name)['hits'] += 1
+        return True, results[key]
+
+    def get(self, name, **params):
+        with self._lock:
+            if name in self._sources:
+                return self._sources[name][1]
+            key = self._key(name, params)
+            found, value = self._lookup(name, key)
+            if found:
+                return value
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        func, deps, param_names = STAGES[name]
+        with key_lock:
+            # 待っている間に他のスレッドが同じ結果を計算していれば、それを使う
+            with self._lock:
+                found, value = self._lookup(name, key)
+            if found:
+                return value
+
+            inputs = [self.get(dep, **params) for dep in deps]
+            start = time.perf_counter()
+            value = func(*inputs, **{p: params.get(p, default) for p, default in param_names.items()})
+            elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+
+            with self._lock:
+                stats = self._stats(name)
+                stats['misses'] += 1
+                stats['elapsed_ms'] = elapsed_ms
+                results = self._results.setdefault(name, OrderedDict())
+                results[key] = value
+                while len(results) > MAX_RESULTS_PER_STAGE:
+                    results.popitem(last=False)
+                self._key_locks.pop(key, None)
+            return value
+
+    def _stats(self, name):
+        return self.stats.setdefault(name, {'hits': 0, 'misses': 0, 'patched': 0, 'elapsed_ms': None})
+
+    def cached(self, name, **params):
+        # 計算済みの結果（なければ計算せずに None を返す）
+        with self._lock:
+            return self._results.get(name, {}).get(self._key(name, params))
+
+    def put(self, name, value, **params):
+        # 前回のデータの結果を差分だけで更新した値を、計算済みの結果として登録する
+        with self._lock:
+            results = self._results.setdefault(name, OrderedDict())
+            results[self._key(name, params)] = value
+            self._used[name] = time.monotonic()
+            self._stats(name)['patched'] += 1
+            while len(results) > MAX_RESULTS_PER_STAGE:
+                results.popitem(last=False)
+
+    def results(self):
+        with self._lock:
+            return [(name, list(results.values())) for name, results in self._results.items() if results]
+
+    def result_names(self):
+        with self._lock:
+            return [name for name, results in self._results.items() if results]
+
+    def last_used(self, name):
+        # 段階が最後に使われた時刻（time.monotonic()）
+        return self._used.get(name, 0.0)
+
+    def evict(self, name):
+        # 破棄した段階は次に使うときに計算し直す
+        with self._lock:
+            self._results.pop(name, None)
+
+    def stats_frame(self):
+        # デバッグ表示用の段階ごとのヒット数・ミス数・最後の計算時間
+        # 他のセッションが同時に段階を追加・更新するため、ロックを持って写しを取ってから表を作る
+        with self._lock:
+            items = [(name, dict(stats)) for name, stats in self.stats.items()]
+        rows = [{'段階': name, 'ヒット': stats['hits'], 'ミス': stats['misses'], '差分更新': stats['patched'],
+                 '計算時間(ms)': stats['elapsed_ms']}
+                for name, stats in items]
+        return pd.DataFrame(rows, columns=['段階', 'ヒット', 'ミス', '差分更新', '計算時間(ms)'])
@@ -0,0 +1,82 @@
+import os
+import threading
+
+# 日本語フォントの候補（上から順に探す）
+# ファイルパスまたはフォント名で指定する。環境変数 APP_CJK_FONTS にカンマ区切りで指定すると置き換えられる
+DEFAULT_FONT_CANDIDATES = [
+    'msgothic.ttc',
+    'C:/Windows/Fonts/msgothic.ttc',
+    'Yu Gothic',
+    'Meiryo',
+    'Hiragino Sans',
+    'IPAexGothic',
+    'IPAGothic',
+    'Noto Sans CJK JP',
+    'Noto Sans JP',
+    'TakaoGothic',
+]
+
+_lock = threading.Lock()
+_font = None
+
+
+class JapaneseFont:
+    def __init__(self, name, path, prop):
+        self.name = name
+        self.path = path
+        self.prop = prop
+
+    @property
+    def available(self):
+        return self.path is not None
+
+
+def font_candidates():
+    env = os.environ.get('APP_CJK_FONTS')
+    if env:
+        return [candidate.strip() for candidate in env.split(',') if candidate.strip()]
+    return DEFAULT_FONT_CANDIDATES
+
+
+def _find_font_path(candidate):
+    import matplotlib.font_manager as fm
+
+    if os.path.exists(candidate):
+        return candidate
+    try:
+        return fm.findfont(fm.FontProperties(family=candidate), fallback_to_default=False)
+    except ValueError:
+        return None
+
+
+def _load_font():
+    import matplotlib
+    import matplotlib.font_manager as fm
+
+    for candidate in font_candidates():
+        path = _find_font_path(candidate)
+        if path is None:
+            continue
+        # フォントを登録し、fontproperties を指定しない文字列にも使われるようにする
+        fm.fontManager.addfont(path)
+        prop = fm.FontProperties(fname=path)
+        name = prop.get_name()
+        matplotlib.rcParams['font.family'] = [name, 'sans-serif']
+        return JapaneseFont(name, path, prop)
+
+    # 見つからない場合は既定のフォントを使う（日本語は表示できない）
+    return JapaneseFont(None, None, fm.FontProperties())
+
+
+def get_font():
+    # フォントの検索と読み込みはプロセスで1回だけ行う
+    global _font
+    if _font is None:
+        with _lock:
+            if _font is None:
+                _font = _load_font()
+    return _font
+
+
+def font_prop():
+    return get_font().prop
@@ -0,0 +1,117 @@
+# 年度ごとの列（配当金2020, 配当利回り2020, ...）を指標・年度ごとの配列に分けて保持し、企業ごとの推移の統計量を計算する
+import numpy as np
+import pandas as pd
+
+# 推移を保持する列の接頭辞と、値に掛ける倍率（配当利回りは前処理と同じくパーセントにする）
+HISTORY_PREFIXES = {'配当金': 1, '配当利回り': 100}
+
+# 配当金平均の既定の年数（直近の年度から数える）
+DIVIDEND_AVERAGE_YEARS = 4
+
+STAT_COLUMNS = ['年数', '平均', 'CAGR', '変動率', '安定性']
+
+
+def year_columns(columns, prefix):
+    # {年度: 列名}（年度順）
+    years = {int(column[len(prefix):]): column for column in columns
+             if isinstance(column, str) and column.startswith(prefix) and column[len(prefix):].isdigit()}
+    return dict(sorted(years.items()))
+
+
+def log_growth(values):
+    # (行, 年度) の配列から前年比の対数成長率の (行, 年度 - 1) の配列を作る（どちらかの年が欠損、または 0 以下の場合は NaN）
+    with np.errstate(invalid='ignore', divide='ignore'):
+        growth = np.log(values[:, 1:] / values[:, :-1])
+    growth[~np.isfinite(growth)] = np.nan
+    return growth
+
+
+class HistoryStore:
+    # 指標ごとに {年度: 行の順の値の配列} を持つ（年度ごとに区分した列指向の形式）
+    # 直近の N 年などの問い合わせでは、その年度の配列だけを取り出して計算する
+
+    def __init__(self, df, prefixes=HISTORY_PREFIXES):
+        self.names = df['企業名'].to_numpy() if '企業名' in df.columns else np.arange(len(df))
+        self.partitions = {}
+        for prefix, scale in prefixes.items():
+            columns = year_columns(df.columns, prefix)
+            if columns:
+                self.partitions[prefix] = {year: pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float) * scale
+                                           for year, column in columns.items()}
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def metrics(self):
+        return list(self.partitions)
+
+    def years(self, metric):
+        return list(self.partitions.get(metric, {}))
+
+    def _window_years(self, metric, window):
+        years = self.years(metric)
+        return years if not window else years[-window:]
+
+    def matrix(self, metric, window=None, rows=None):
+        # (行, 年度) の配列（window は直近の年数、rows は行の位置）
+        years = self._window_years(metric, window)
+        partition = self.partitions.get(metric, {})
+        n = len(self) if rows is None else len(rows)
+        if not years:
+            return years, np.empty((n, 0))
+        columns = [partition[year] if rows is None else partition[year][rows] for year in years]
+        return years, np.column_stack(columns)
+
+    def latest(self, metric, rows=None):
+        # 行ごとの最も新しい年度の値（欠損の年度は飛ばす）
+        _, values = self.matrix(metric, rows=rows)
+        valid = ~np.isnan(values)
+        latest = np.full(len(values), np.nan)
+        if not values.shape[1]:
+            return latest
+        found = valid.any(axis=1)
+        last = values.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+        latest[found] = values[found, last[found]]
+        return latest
+
+    def stats(self, metric, window=None, rows=None):
+        """
+        行ごとの直近 window 年の推移の統計量を返す。
+        平均: 欠損を除いた平均、CAGR: 最初と最後の値から求めた年平均成長率、
+        変動率: 前年比の対数成長率の標準偏差、安定性: 前年から減らなかった年の割合
+        """
+        years, values = self.matrix(metric, window, rows)
+        n = len(values)
+        valid = ~np.isnan(values)
+        counts = valid.sum(axis=1)
+        if not years:
+            return pd.DataFrame({'年数': counts}, columns=STAT_COLUMNS).astype({column: float for column in STAT_COLUMNS[1:]})
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(counts > 0, np.where(valid, values, 0.0).sum(axis=1) / counts, np.nan)
+
+            # 最初と最後の値のある年度（値がない行は 0 番目になるが、counts で除外する）
+            first = np.argmax(valid, axis=1)
+            last = values.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+            first_values = values[np.arange(n), first]
+            last_values = values[np.arange(n), last]
+            spans = np.asarray(years, dtype=float)[last] - np.asarray(years, dtype=float)[first]
+            usable = (counts >= 2) & (spans > 0) & (first_values > 0) & (last_values > 0)
+            cagr = np.full(n, np.nan)
+            cagr[usable] = (last_values[usable] / first_values[usable]) ** (1 / spans[usable]) - 1
+
+            # 連続する年度の変化（どちらかが欠損の年は除く）
+            growth = log_growth(values)
+            growth_counts = (~np.isnan(growth)).sum(axis=1)
+            volatility = np.full(n, np.nan)
+            enough = growth_counts >= 2
+            volatility[enough] = np.nanstd(growth[enough], axis=1, ddof=1)
+
+            pairs = valid[:, 1:] & valid[:, :-1]
+            kept = pairs & (values[:, 1:] >= values[:, :-1])
+            pair_counts = pairs.sum(axis=1)
+            stability = np.where(pair_counts > 0, kept.sum(axis=1) / pair_counts, np.nan)
+
+        return pd.DataFrame({'年数': counts, '平均': means, 'CAGR': cagr, '変動率': volatility, '安定性': stability},
+                            columns=STAT_COLUMNS)
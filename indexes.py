@@ -0,0 +1,234 @@
+import numpy as np
+import pandas as pd
+
+# ランキングの対象にする指標
+RANKING_METRICS = ['自己資本比率', 'ROE', 'ROA', 'PER', 'PBR', '配当利回り']
+
+# 値が小さいほど良い指標（既定で昇順に並べる）
+LOWER_IS_BETTER = ['PER', 'PBR']
+
+
+class RankingIndex:
+    # 全指標の並び順と順位を一度に計算して保持する
+
+    def __init__(self, df, metrics=None, order=None):
+        self.df = df
+        self.metrics = [metric for metric in (metrics or RANKING_METRICS) if metric in df.columns]
+        missing = np.isnan(self._values(df))
+
+        # 欠損値はどちらの向きでも最後に並べる。同じ値は元の行の順（nlargest と同じ）
+        self.order = order or {
+            ascending: np.argsort(self._sort_keys(df, ascending, np.inf), axis=0, kind='stable')
+            for ascending in (False, True)
+        }
+
+        # 行の位置 → 順位（0始まり）の逆引き
+        n = len(df)
+        self.rank_of = {}
+        for ascending, order in self.order.items():
+            ranks = np.empty_like(order)
+            ranks[order, np.arange(len(self.metrics))] = np.arange(n)[:, None]
+            self.rank_of[ascending] = ranks
+
+        self.missing = missing
+        self.counts = (~missing).sum(axis=0)
+
+    def _values(self, df):
+        return df[self.metrics].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+    def _sort_keys(self, df, ascending, missing_key):
+        values = self._values(df)
+        return np.where(np.isnan(values), missing_key, values if ascending else -values)
+
+    def patched(self, df, old_to_new, inserted):
+        """
+        行の一部だけが変わった新しいデータの索引を返す（並べ替え直さない）。
+        old_to_new: 元の行の位置 → 新しい行の位置（変更・削除した行は -1、変更のない行の順序は変わらないこと）
+        inserted: 変更・追加した行の新しい位置
+        """
+        # (値, 行の位置) の順に並べるため、複素数の実部に値、虚部に行の位置を入れて辞書式に比較する
+        # 欠損値は最後に並べるため、inf の代わりに最大の有限の値にする（inf と虚部の組み合わせは比較が不安定なため）
+        inserted = np.asarray(inserted, dtype=np.intp)
+        order = {}
+        for ascending, old_order in self.order.items():
+            keys = self._sort_keys(df, ascending, np.finfo(float).max)
+            columns = []
+            for j in range(len(self.metrics)):
+                kept = old_to_new[old_order[:, j]]
+                kept = kept[kept >= 0]
+                new_keys = np.sort(keys[inserted, j] + 1j * inserted)
+                positions = np.searchsorted(keys[kept, j] + 1j * kept, new_keys)
+                columns.append(np.insert(kept, positions, new_keys.imag.astype(kept.dtype)))
+            order[ascending] = np.column_stack(columns) if columns else np.empty((len(df), 0), dtype=np.intp)
+        return RankingIndex(df, self.metrics, order)
+
+    def _column(self, metric):
+        return self.metrics.index(metric)
+
+    def top_positions(self, metric, k, ascending=False):
+        j = self._column(metric)
+        return self.order[ascending][:min(k, self.counts[j]), j]
+
+    def top(self, metric, k, ascending=False, columns=None):
+        rows = self.df.iloc[self.top_positions(metric, k, ascending)]
+        return rows if columns is None else rows[columns]
+
+    def rank(self, position, metric, ascending=False):
+        # 指定した行の順位（1始まり）。値が欠損している場合は None
+        j = self._column(metric)
+        if self.missing[position, j]:
+            return None
+        return int(self.rank_of[ascending][position, j]) + 1
+
+    def ranks(self, position, ascending_metrics=()):
+        # 指定した行の全指標の順位
+        return {metric: self.rank(position, metric, metric in ascending_metrics) for metric in self.metrics}
+
+
+class CompanyIndex:
+    # 企業名 → 行の位置の索引（企業名はカテゴリのコードに変換して保持する）
+
+    def __init__(self, df, column='企業名'):
+        self.df = df
+        codes, names = pd.factorize(df[column], sort=False)
+        self.codes = codes
+        # 企業名は最初に出てきた順に並べる（unique() と同じ順）
+        self.names = list(names)
+        self._code_of = {name: code for code, name in enumerate(self.names)}
+
+        # コードごとの行の位置を1回の並べ替えでまとめる
+        valid = codes >= 0
+        order = np.argsort(codes[valid], kind='stable')
+        self._positions = np.flatnonzero(valid)[order]
+        counts = np.bincount(codes[valid], minlength=len(self.names))
+        self._starts = np.concatenate([[0], np.cumsum(counts)])
+        self.counts = counts
+
+    def positions(self, name):
+        # 同じ企業名の行がすべて返る（存在しない場合は空）
+        code = self._code_of.get(name)
+        if code is None:
+            return self._positions[:0]
+        return self._positions[self._starts[code]:self._starts[code + 1]]
+
+    @property
+    def duplicates(self):
+        return [name for name, count in zip(self.names, self.counts) if count > 1]
+
+    def row_positions(self, names, in_frame_order=False):
+        # 選択した順の行の位置（同名の企業はすべての行を含む）
+        positions = [self.positions(name) for name in names]
+        positions = np.concatenate(positions) if positions else self._positions[:0]
+        return np.sort(positions) if in_frame_order else positions
+
+    def rows(self, names, df=None, in_frame_order=False):
+        # 選択した順に行を取り出す（同名の企業はすべての行を含む）
+        df = self.df if df is None else df
+        return df.iloc[self.row_positions(names, in_frame_order)]
+
+
+
+def _sorted_quantile(values, q):
+    # 並べ替え済みの値の分位点（pandas の quantile と同じ線形補間）
+    if len(values) == 0:
+        return np.nan
+    position = q * (len(values) - 1)
+    lower = int(np.floor(position))
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class IndustryCube:
+    # 業種ごと・列ごとの集計値（件数・平均・中央値・四分位・最小・最大）を保持する
+    # 業種・列ごとに値を並べ替えた配列を持ち、行が追加・変更・削除されたときは
+    # その行の値だけを配列から出し入れして、変わった業種の集計値だけを計算し直す
+
+    STATS = ['件数', '平均', '中央値', '25%点', '75%点', '最小', '最大']
+
+    def __init__(self, df, columns, group_column='業種'):
+        self.group_column = group_column
+        self.columns = [column for column in columns if column in df.columns]
+        self._data = self._values(df)
+        self._sorted = {}
+        for industry, rows in self._data.groupby(group_column, sort=False):
+            self._sorted[industry] = [np.sort(values[~np.isnan(values)]) for values in rows[self.columns].to_numpy().T]
+        self._rows = self._data[group_column].value_counts().to_dict()
+        self._summaries = {industry: self._summary(industry) for industry in self._sorted}
+        self.table = self._table()
+
+    def _values(self, df):
+        values = df[self.columns].apply(pd.to_numeric, errors='coerce').astype(float)
+        values.insert(0, self.group_column, df[self.group_column].astype(object))
+        return values
+
+    def _table(self):
+        # 列は (統計量, 元の列) の MultiIndex、行は業種
+        industries = sorted(self._summaries, key=str)
+        values = np.array([self._summaries[industry] for industry in industries], dtype=float)
+        values = values.reshape(len(industries), len(self.STATS), len(self.columns))
+        index = pd.Index(industries, name=self.group_column)
+        parts = {stat: pd.DataFrame(values[:, k], index=index, columns=self.columns) for k, stat in enumerate(self.STATS)}
+        parts['件数'] = parts['件数'].astype(int)
+        return pd.concat(parts, axis=1)
+
+    def _summary(self, industry):
+        # 統計量の順・列の順に並べた1業種分の集計値
+        arrays = self._sorted[industry]
+        counts = [len(values) for values in arrays]
+        means = [values.mean() if len(values) else np.nan for values in arrays]
+        medians = [_sorted_quantile(values, 0.5) for values in arrays]
+        lower = [_sorted_quantile(values, 0.25) for values in arrays]
+        upper = [_sorted_quantile(values, 0.75) for values in arrays]
+        mins = [values[0] if len(values) else np.nan for values in arrays]
+        maxs = [values[-1] if len(values) else np.nan for values in arrays]
+        return counts + means + medians + lower + upper + mins + maxs
+
+    def _move(self, rows, sign):
+        # rows の値を業種ごとの配列に追加（sign=1）または配列から削除（sign=-1）する
+        for industry, group in rows.dropna(subset=[self.group_column]).groupby(self.group_column, sort=False):
+            arrays = self._sorted.setdefault(industry, [np.empty(0) for _ in self.columns])
+            self._rows[industry] = self._rows.get(industry, 0) + sign * len(group)
+            for j, values in enumerate(group[self.columns].to_numpy().T):
+                values = np.sort(values[~np.isnan(values)])
+                if sign > 0:
+                    arrays[j] = np.insert(arrays[j], np.searchsorted(arrays[j], values), values)
+                else:
+                    # 同じ値が複数ある場合は、その値の位置から順に削除する
+                    positions = np.searchsorted(arrays[j], values) + np.arange(len(values)) - np.searchsorted(values, values)
+                    arrays[j] = np.delete(arrays[j], positions)
+
+    def copy(self):
+        # update() は配列や表を置き換えるだけで書き換えないため、入れ物だけを複製すれば元の集計値と独立に更新できる
+        cube = IndustryCube.__new__(IndustryCube)
+        cube.__dict__.update(self.__dict__)
+        cube._sorted = {industry: list(arrays) for industry, arrays in self._sorted.items()}
+        cube._rows = dict(self._rows)
+        cube._summaries = dict(self._summaries)
+        return cube
+
+    def stat(self, name, columns=None):
+        # 1つの統計量を (業種 × 列) の表で返す
+        return self.table[name][self.columns if columns is None else columns]
+
+    def update(self, changed=None, removed=()):
+        # changed: 追加・変更した行（行ラベルで元の行と対応させる）、removed: 削除した行のラベル
+        changed = self._values(changed) if changed is not None else self._data.iloc[:0]
+        labels = pd.Index(removed).append(changed.index)
+        old = self._data.loc[labels.intersection(self._data.index)]
+        affected = set(old[self.group_column].dropna()) | set(changed[self.group_column].dropna())
+        if not affected:
+            return []
+
+        self._move(old, -1)
+        self._move(changed, 1)
+        self._data = pd.concat([self._data.drop(index=old.index), changed])
+
+        for industry in affected:
+            if self._rows.get(industry, 0) > 0:
+                self._summaries[industry] = self._summary(industry)
+            else:
+                # 行がなくなった業種は削除する
+                for items in (self._sorted, self._rows, self._summaries):
+                    items.pop(industry, None)
+        self.table = self._table()
+        return sorted(affected, key=str)
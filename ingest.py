@@ -0,0 +1,221 @@
+import io
+import threading
+
+import openpyxl
+import pandas as pd
+
+from dataset_store import dataset_store
+from delta import RowDelta, change_summary, patch_derived
+from derived import WARM_STAGES, DerivedCache
+from memory import compact_frame
+from workbook_cache import content_hash, load_cached_sheets, store_sheets
+
+# セッションのキーと読み込むシート名
+SHEETS = {
+    'page1_data': '分析事項_有価証券(貼付用)',
+    'page2_data': '分析事項_購入検討有価証券',
+}
+
+# 各シートで使用する列（年度ごとの列は接頭辞で指定）
+REQUIRED_COLUMNS = {
+    'page1_data': ['企業名', '業種', '自己資本比率', 'ROE', 'ROA', 'PER', 'PBR', '配当利回り', '時価'],
+    'page2_data': ['企業名', '業種', '自己資本比率', 'ROE', 'ROA', 'PER', 'PBR', '配当利回り', '株価', '1株当たり配当金', '購入株数'],
+}
+YEAR_COLUMN_PREFIXES = {
+    'page1_data': ['配当金', '配当利回り'],
+    'page2_data': [],
+}
+
+# 進捗を通知する行数の間隔
+PROGRESS_INTERVAL = 1000
+
+
+class IngestCancelled(Exception):
+    pass
+
+
+def _is_year_column(name, prefix):
+    return name.startswith(prefix) and name[len(prefix):].isdigit()
+
+
+def _wanted_column(key, name):
+    if not isinstance(name, str):
+        return False
+    if name in REQUIRED_COLUMNS[key]:
+        return True
+    return any(_is_year_column(name, prefix) for prefix in YEAR_COLUMN_PREFIXES[key])
+
+
+def _cache_name(key):
+    # 読み込む列の定義が変わったら別のキャッシュとして扱う
+    spec = REQUIRED_COLUMNS[key] + [prefix + '*' for prefix in YEAR_COLUMN_PREFIXES[key]]
+    return SHEETS[key] + '|' + ','.join(spec)
+
+
+def _read_sheet(ws, key, progress=None, cancelled=None):
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None) or ()
+    keep = [i for i, name in enumerate(header) if _wanted_column(key, name)]
+    columns = [header[i] for i in keep]
+
+    records = []
+    for row in rows:
+        values = [row[i] if i < len(row) else None for i in keep]
+        # 空行は読み飛ばす
+        if all(value is None for value in values):
+            continue
+        records.append(values)
+
+        if len(records) % PROGRESS_INTERVAL == 0:
+            if cancelled is not None and cancelled():
+                raise IngestCancelled()
+            if progress is not None:
+                progress(ws.title, len(records), ws.max_row)
+
+    if progress is not None:
+        progress(ws.title, len(records), ws.max_row)
+    return pd.DataFrame(records, columns=columns)
+
+
+def read_workbook(data, keys=None, progress=None, cancelled=None):
+    # ワークブックを1回だけ開き、必要なシートの必要な列だけを読み込む
+    # ワークブックにないシートは読み込まない（どのシートが足りないかは missing_sheets() で調べる）
+    keys = list(SHEETS) if keys is None else keys
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        present = [key for key in keys if SHEETS[key] in wb.sheetnames]
+        return {key: _read_sheet(wb[SHEETS[key]], key, progress, cancelled) for key in present}
+    finally:
+        wb.close()
+
+
+def missing_sheets(datasets):
+    # 読み込めなかったシート（セッションのキー → シート名）
+    return {key: name for key, name in SHEETS.items() if key not in datasets}
+
+
+def load_workbook(data, progress=None, cancelled=None, digest=None):
+    # 同じ内容のファイルはキャッシュから読み込む
+    digest = content_hash(data) if digest is None else digest
+    cached = load_cached_sheets(digest, [_cache_name(key) for key in SHEETS])
+
+    # 変換前に保存されたキャッシュも同じ型にそろえる（ないと記録したシートは読み込み済みとして扱う）
+    datasets = {}
+    for key in SHEETS:
+        if cached.get(_cache_name(key)) is not None:
+            datasets[key] = compact_frame(cached[_cache_name(key)])
+
+    missing = [key for key in SHEETS if _cache_name(key) not in cached]
+    if missing:
+        # 省メモリの型に変換してから保存する
+        parsed = {key: compact_frame(df) for key, df in read_workbook(data, missing, progress, cancelled).items()}
+        store_sheets(digest, {_cache_name(key): df for key, df in parsed.items()},
+                     absent=[_cache_name(key) for key in missing if key not in parsed])
+        datasets.update(parsed)
+    if not datasets:
+        raise ValueError(f"シートが見つかりません: {', '.join(SHEETS.values())}")
+    return digest, datasets
+
+
+# セッションのキーと、差分の表示に使うページ名
+PAGES = {
+    'page1_data': 'page1',
+    'page2_data': 'page2',
+}
+
+
+def score_datasets(digest, datasets, previous=None):
+    # 各シートを派生データの入力にし、前処理・スコア計算・索引の作成を済ませておく
+    # previous（前回のデータ）があれば、変更した行だけをスコア計算し、順位や集計値は差分だけで更新する
+    derived = DerivedCache()
+    for key, df in datasets.items():
+        derived.set_source(key, digest, df)
+    if previous is not None:
+        for key, page in PAGES.items():
+            if key in datasets and key in previous.datasets:
+                delta = RowDelta(previous.datasets[key], datasets[key])
+                if delta.patchable:
+                    patch_derived(derived, previous.derived, page, delta)
+    for name in WARM_STAGES:
+        # シートがないページの段階は計算しない
+        if derived.available(name):
+            derived.get(name)
+    return derived
+
+
+def upload_changes(previous, entry):
+    # 前回のデータからの変更の一覧（ページ名 → 表）
+    changes = {}
+    for key, page in PAGES.items():
+        if key in entry.datasets and key in previous.datasets:
+            old_df, new_df = previous.datasets[key], entry.datasets[key]
+            changes[page] = change_summary(old_df, new_df, previous.derived.get(f'{page}_scored'),
+                                           entry.derived.get(f'{page}_scored'), RowDelta(old_df, new_df))
+    return changes
+
+
+class IngestJob:
+    # ワークブックの読み込みとスコア計算をバックグラウンドのスレッドで行う
+
+    def __init__(self, data, file_name, previous=None):
+        self.data = data
+        self.file_name = file_name
+        # 前回読み込んだデータの参照（変更した行だけを計算し、変更の一覧を作る）
+        self.previous = previous
+        self.changes = None
+        self.sheet = None
+        self.rows = 0
+        self.total_rows = None
+        self.result = None
+        self.error = None
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def done(self):
+        return not self._thread.is_alive()
+
+    def _report(self, sheet, rows, total_rows):
+        self.sheet = sheet
+        self.rows = rows
+        # ヘッダー行を除いた行数
+        self.total_rows = total_rows - 1 if total_rows else None
+
+    def _run(self):
+        try:
+            # 他のセッションで読み込み済みのデータは、読み込み直さずにそのまま参照する
+            digest = content_hash(self.data)
+            handle = dataset_store.acquire(digest)
+            if handle is None:
+                digest, datasets = load_workbook(self.data, self._report, self._cancel.is_set, digest)
+                if self.cancelled:
+                    return
+                self.sheet = 'スコア計算'
+                derived = score_datasets(digest, datasets, self.previous.entry if self.previous else None)
+                if self.cancelled:
+                    return
+                handle = dataset_store.put(digest, datasets, derived)
+            if self.previous is not None and self.previous.digest != digest:
+                self.changes = upload_changes(self.previous.entry, handle.entry)
+            # 読み込みとスコア計算が全て終わってから結果をまとめて公開する
+            self.result = handle
+        except IngestCancelled:
+            pass
+        except Exception as e:
+            # スレッド内の例外は呼び出し元に伝わらないため、メッセージとして保持する
+            self.error = str(e)
+        finally:
+            # 読み込みが終わったらファイルの中身と前回のデータの参照は不要
+            self.data = None
+            self.previous = None
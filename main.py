@@ -1,24 +1,253 @@
+import time
+_script_start = time.perf_counter()
+
+import importlib
 import streamlit as st
-import home
-import page1
-import page2
-import page3
-import streamlit as st
-import pandas as pd
+from chart_display import select_backend
+from perf import record_startup, span, span_summary
+
+_imports_done = time.perf_counter()
+
+# サイドバーの項目と、選択されたときに読み込むモジュール
+PAGES = {
+    "Home": "home",
+    "Page 1": "page1",
+    "Page 2": "page2",
+    "Page 3": "page3",
+}
+PAGE_LABELS = {module: label for label, module in PAGES.items()}
+
+
+def upload_workbook():
+    # 1回のアップロードで Page 1 と Page 2 のデータをまとめて読み込む
+    uploaded_file = st.sidebar.file_uploader("エクセルファイルをアップロード", type="xlsx")
+
+    # 同じファイルが選択されたままの再実行では読み込み直さない
+    if uploaded_file and st.session_state.get('workbook_file_id') != uploaded_file.file_id:
+        # pandas や openpyxl はファイルがアップロードされてから読み込む
+        from ingest import IngestJob
+
+        previous_job = st.session_state.get('ingest_job')
+        if previous_job is not None:
+            previous_job.cancel()
+        # 前回のデータと比べて、変更した行だけを計算し直す
+        st.session_state['ingest_job'] = IngestJob(uploaded_file.getvalue(), uploaded_file.name,
+                                                   st.session_state.get('dataset_handle')).start()
+        st.session_state['workbook_file_id'] = uploaded_file.file_id
+
+    job = st.session_state.get('ingest_job')
+    if job is None:
+        return
+
+    if job.done:
+        # 読み込みが完了したら、前のデータと一度に入れ替える
+        del st.session_state['ingest_job']
+        if job.error:
+            st.sidebar.error(job.error)
+        elif job.result is not None:
+            from ingest import SHEETS, missing_sheets
+
+            # 前のワークブックにしかないシートのデータは残さない
+            for key in SHEETS:
+                st.session_state.pop(key, None)
+            # 全セッションで共有するデータを参照する（前のデータへの参照はここで外れる）
+            st.session_state.update(job.result.session_values())
+            # シートがないページでは、そのシートがないことを表示する
+            st.session_state['missing_sheets'] = missing_sheets(job.result.entry.datasets)
+            st.session_state['upload_changes'] = job.changes
+    else:
+        # 読み込み中も前のデータはそのまま操作できる
+        with st.sidebar:
+            show_ingest_progress()
+
+
+@st.fragment(run_every=0.5)
+def show_ingest_progress():
+    job = st.session_state.get('ingest_job')
+    if job is None:
+        return
+
+    if job.done:
+        # 完了したらページ全体を再実行して結果を反映する
+        st.rerun()
+
+    st.write(f"読み込み中: {job.file_name}")
+    if job.sheet:
+        if job.total_rows:
+            st.progress(min(job.rows / job.total_rows, 1.0), text=f"{job.sheet}: {job.rows:,} / {job.total_rows:,} 行")
+        else:
+            st.write(f"{job.sheet}: {job.rows:,} 行")
+
+    if job.cancelled:
+        st.write("キャンセルしています...")
+    elif st.button("読み込みをキャンセル"):
+        job.cancel()
+        st.rerun()
+
+
+def select_scoring():
+    # スコアの計算方法と指標の重み（各ページは session_state の scoring_params を派生データの引数に渡す）
+    from scoring import SCORE_COLUMNS, SCORING_METHODS
+
+    method = st.sidebar.selectbox("スコアの計算方法", list(SCORING_METHODS), format_func=SCORING_METHODS.get,
+                                  key='scoring_method')
+    with st.sidebar.expander("指標の重み"):
+        weights = tuple(st.number_input(column, min_value=0.0, max_value=5.0, value=1.0, step=0.5, key=f'weight_{column}')
+                        for column in SCORE_COLUMNS)
+    # 重みが全て 1 のときは従来の合計スコアと同じ計算結果を使い回す
+    st.session_state['scoring_params'] = {
+        'scoring_method': method,
+        'weights': None if all(weight == 1.0 for weight in weights) else weights,
+    }
+
+
+def show_upload_changes():
+    # 前回アップロードしたデータからの変更（追加・削除・変更した企業と合計スコアの変化）
+    changes = st.session_state.get('upload_changes')
+    if not changes:
+        return
+
+    with st.sidebar.expander("前回のアップロードからの変更"):
+        for page, summary in changes.items():
+            counts = summary['変更'].value_counts()
+            st.write(f"{PAGE_LABELS.get(page, page)}: 追加 {counts.get('追加', 0)} 件・削除 {counts.get('削除', 0)} 件・"
+                     f"変更 {counts.get('変更', 0)} 件")
+            if not summary.empty:
+                st.dataframe(summary.style.format({'合計スコア（前）': '{:g}', '合計スコア（後）': '{:g}', '差': '{:+g}'},
+                                                  na_rep='-'), hide_index=True)
+
+
+def show_memory_usage():
+    from dataset_store import MAX_STORE_BYTES, dataset_store
+    from memory import SESSION_MEMORY_BUDGET_BYTES, enforce_budget, memory_report
+
+    # セッションの上限はこのセッションだけが持つ値に、共有のデータの上限はプロセス全体に適用する
+    evicted, remaining = enforce_budget(st.session_state)
+    if evicted:
+        st.sidebar.warning(f"メモリ使用量が上限を超えたため、計算結果を破棄しました: {', '.join(evicted)}")
+    if remaining > SESSION_MEMORY_BUDGET_BYTES:
+        st.sidebar.warning(f"このセッションのメモリ使用量 {remaining / 1024 / 1024:,.1f} MB が上限の "
+                           f"{SESSION_MEMORY_BUDGET_BYTES / 1024 / 1024:,.0f} MB を超えています。")
+    dataset_store.evict()
+
+    report = memory_report(st.session_state)
+    total_mb = report.loc[~report['共有'], 'バイト数'].sum() / 1024 / 1024
+    with st.sidebar.expander(f"メモリ使用量: {total_mb:,.1f} / {SESSION_MEMORY_BUDGET_BYTES / 1024 / 1024:,.0f} MB"):
+        report['MB'] = (report['バイト数'] / 1024 / 1024).round(2)
+        st.dataframe(report[['項目', '共有', 'MB']], hide_index=True)
+
+        count, store_bytes, refs = dataset_store.summary()
+        st.caption(f"全セッションで共有しているデータ: {count} 件・{store_bytes / 1024 / 1024:,.1f} MB"
+                   f"（上限 {MAX_STORE_BYTES / 1024 / 1024:,.0f} MB、参照中のセッション {refs}）")
+
+
+def show_report_export():
+    # スコア一覧・トップ10・業種別平均・グラフをファイルに出力する（作成中も他の操作はできる）
+    from functools import partial
+
+    from report import MIME_TYPES, ExportJob, read_file
+
+    with st.sidebar.expander("レポートを出力"):
+        job = st.session_state.get('export_job')
+        # 別のワークブックを読み込んだら、前のデータのレポートは破棄する
+        if job is not None and job.done and job.derived is not st.session_state['derived']:
+            job.cleanup()
+            del st.session_state['export_job']
+            job = None
+        if job is not None and not job.done:
+            show_export_progress()
+            return
+
+        include_pdf = st.checkbox("PDF も作成する", key='report_include_pdf')
+        if st.button("レポートを作成"):
+            if job is not None:
+                job.cleanup()
+            st.session_state['export_job'] = ExportJob(st.session_state['derived'], include_pdf,
+                                                         st.session_state.get('scoring_params')).start()
+            st.rerun()
+
+        if job is not None:
+            if job.error:
+                st.error(job.error)
+            for fmt, path in job.files:
+                # ファイルはボタンが押されたときに読み込む（再実行のたびにファイル全体を読み込まない）
+                st.download_button(f"{fmt.upper()} をダウンロード", partial(read_file, path), file_name=f"report.{fmt}",
+                                   mime=MIME_TYPES[fmt], key=f'report_download_{fmt}')
+
+
+@st.fragment(run_every=0.5)
+def show_export_progress():
+    job = st.session_state.get('export_job')
+    if job is None:
+        return
+
+    if job.done:
+        # 完了したらページ全体を再実行してダウンロードのボタンを表示する
+        st.rerun()
+
+    st.progress(job.progress, text=job.step or "準備中")
+    if job.cancelled:
+        st.write("キャンセルしています...")
+    elif st.button("作成をキャンセル"):
+        job.cancel()
+        st.rerun()
+
+
+def show_perf_panel(timing):
+    # 今回の実行の段階ごとの処理時間と、直近の実行の p50 / p95
+    import pandas as pd
+
+    st.sidebar.write(f"今回の実行: {timing['total_ms']:,.0f} ms")
+    summary = pd.DataFrame(span_summary(timing['spans']))
+    if not summary.empty:
+        summary.columns = ['ページ', '段階', '今回(ms)', 'p50(ms)', 'p95(ms)', '回数']
+        st.sidebar.dataframe(summary, hide_index=True)
 
 
 def main():
     st.sidebar.title("Navigation")
-    page = st.sidebar.radio("Go to", ["Home", "Page 1", "Page 2","Page 3"])
-
-    if page == "Home":
-        home.show()
-    elif page == "Page 1":
-        page1.show()
-    elif page == "Page 2":
-        page2.show()
-    elif page == "Page 3":
-        page3.show()
+    page = st.sidebar.radio("Go to", list(PAGES))
+
+    with span('main', 'アップロード'):
+        upload_workbook()
+    show_upload_changes()
+    select_backend()
+
+    # 解析済みワークブックのキャッシュを削除
+    if st.sidebar.button("キャッシュを削除"):
+        from workbook_cache import cache_size, clear_cache
+
+        size = cache_size()
+        clear_cache()
+        st.sidebar.success(f"キャッシュを削除しました（{size / 1024 / 1024:,.1f} MB）。")
+
+    # 派生データの段階ごとの再利用の状況（デバッグ用）
+    derived = st.session_state.get('derived')
+    if derived is not None:
+        select_scoring()
+        with st.sidebar.expander("計算キャッシュの状況"):
+            st.dataframe(derived.stats_frame(), hide_index=True)
+
+    # 選択されたページのモジュールだけを読み込む
+    page_import_start = time.perf_counter()
+    module = importlib.import_module(PAGES[page])
+    page_import_ms = (time.perf_counter() - page_import_start) * 1000
+
+    with span(page, 'ページ全体'):
+        module.show()
+
+    # セッションのメモリ使用量を表示し、上限を超えたら派生データを破棄する
+    if st.session_state.get('derived') is not None:
+        show_memory_usage()
+        # レポートには Page 1 と Page 2 の両方のデータが必要
+        derived = st.session_state['derived']
+        if derived.available('page1_scored') and derived.available('page2_scored'):
+            show_report_export()
+
+    show_perf = st.sidebar.checkbox("処理時間を表示")
+    timing = record_startup(_script_start, _imports_done, page, page_import_ms)
+    if show_perf:
+        show_perf_panel(timing)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,145 @@
+# セッションで保持するデータの省メモリ化と、メモリ使用量の確認
+import os
+
+import numpy as np
+import pandas as pd
+
+# カテゴリ型で保持する文字列の列
+CATEGORY_COLUMNS = ['企業名', '業種']
+
+# 金額・株数の列（株価 × 株数などの計算で 32 ビットの範囲を超えるため、64 ビットのまま保持する）
+MONEY_COLUMNS = ['時価', '株価', '1株当たり配当金', '購入株数']
+# 年度ごとの配当金の列（配当金2020 など）
+MONEY_PREFIXES = ['配当金']
+
+# セッションごとのメモリ使用量の上限（セッションだけが持つ値を数え、超えたら再計算できる値から破棄する）
+SESSION_MEMORY_BUDGET_BYTES = int(float(os.environ.get('SESSION_MEMORY_BUDGET_MB', 256)) * 1024 * 1024)
+
+# 読み込んだデータのキー
+DATASET_KEYS = ['page1_data', 'page2_data']
+
+# 全セッションで共有しているデータのキー（セッションの使用量には数えず、破棄もしない）
+SHARED_KEYS = DATASET_KEYS + ['derived', 'dataset_handle']
+
+# このキーで始まるセッションの値は再計算できるため、上限を超えたら破棄する
+SESSION_CACHE_PREFIX = 'cache_'
+
+
+def _is_money(column):
+    return column in MONEY_COLUMNS or (isinstance(column, str) and any(column.startswith(prefix) for prefix in MONEY_PREFIXES))
+
+
+def _money_numeric(series):
+    # 金額の列は int64 か float64 にそろえる（以前のキャッシュに int32 で保存された列も広げる）
+    if pd.api.types.is_integer_dtype(series.dtype) and not isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+        return series.astype(np.int64)
+    if pd.api.types.is_float_dtype(series.dtype):
+        values = series.to_numpy(dtype=float)
+        # 欠損のない整数値は int64 にする
+        if not np.isnan(values).any() and np.array_equal(values, np.round(values)) and np.abs(values).max(initial=0) < 2 ** 53:
+            return series.astype(np.int64)
+        return series.astype(np.float64)
+    return series
+
+
+def _compact_numeric(series):
+    # 整数は int32 まで（それより小さくはしない）。金額・株数の列は _money_numeric で 64 ビットのまま保持する
+    if pd.api.types.is_integer_dtype(series.dtype) and not isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+        info = np.iinfo(np.int32)
+        if series.empty or (series.min() >= info.min and series.max() <= info.max):
+            return series.astype(np.int32)
+        return series
+    if pd.api.types.is_float_dtype(series.dtype):
+        values = series.to_numpy(dtype=float)
+        finite = values[~np.isnan(values)]
+        # 欠損のない整数値は整数に、float32 で値が変わらない場合は float32 にする
+        if len(finite) == len(values) and np.array_equal(finite, np.round(finite)):
+            return _compact_numeric(series.astype(np.int64)) if np.abs(finite).max(initial=0) < 2 ** 53 else series
+        if np.array_equal(finite.astype(np.float32).astype(float), finite):
+            return series.astype(np.float32)
+    return series
+
+
+def compact_frame(df):
+    """企業名・業種をカテゴリ型に、数値の列を値が変わらない範囲で小さい型に変換したデータを返す。"""
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        if column in CATEGORY_COLUMNS:
+            series = series.astype('category')
+        else:
+            compact = _money_numeric if _is_money(column) else _compact_numeric
+            if series.dtype == object:
+                # 数値だけの列は数値に変換する（文字列が1つでもあれば元のまま）
+                converted = pd.to_numeric(series, errors='coerce')
+                if converted.notna().sum() == series.notna().sum():
+                    series = compact(converted)
+            else:
+                series = compact(series)
+        columns[column] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+def estimate_bytes(value, seen=None):
+    # DataFrame や索引のオブジェクトが保持する配列の大きさの合計（同じオブジェクトは1回だけ数える）
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_bytes(item, seen) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_bytes(item, seen) for item in value)
+    if hasattr(value, '__dict__'):
+        return estimate_bytes(vars(value), seen)
+    return 0
+
+
+def memory_report(session_state):
+    """
+    メモリ使用量を (項目, 共有, バイト数) の DataFrame で返す。
+    共有のデータ（読み込んだデータと派生データ）を先に数え、セッションの値はそれと重ならない分だけを数える。
+    """
+    seen = set()
+    rows = []
+    for key in DATASET_KEYS:
+        if key in session_state:
+            rows.append((key, True, estimate_bytes(session_state[key], seen)))
+    derived = session_state.get('derived')
+    if derived is not None:
+        for name, value in derived.results():
+            rows.append((name, True, estimate_bytes(value, seen)))
+        seen.add(id(derived))
+    for key in list(session_state.keys()):
+        if key not in SHARED_KEYS:
+            size = estimate_bytes(session_state[key], seen)
+            if size:
+                rows.append((key, False, size))
+    return pd.DataFrame(rows, columns=['項目', '共有', 'バイト数'])
+
+
+def enforce_budget(session_state, budget=SESSION_MEMORY_BUDGET_BYTES):
+    """
+    セッションの値が上限を超えている場合は大きい再計算できる値から破棄し、(破棄したキー, 破棄した後の合計バイト数) を返す。
+    読み込み中のファイルなど破棄できない値だけで上限を超えている場合は、合計が上限を超えたまま返る。
+    """
+    report = memory_report(session_state)
+    owned = report[~report['共有']]
+    total = owned['バイト数'].sum()
+    evicted = []
+    for key, size in owned.sort_values('バイト数', ascending=False)[['項目', 'バイト数']].itertuples(index=False):
+        if total <= budget:
+            break
+        if key.startswith(SESSION_CACHE_PREFIX):
+            del session_state[key]
+            evicted.append(key)
+            total -= size
+    return evicted, total
@@ -0,0 +1,100 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from history import log_growth
+
+# 結果に表示するパーセンタイル
+PERCENTILES = [5, 25, 50, 75, 95]
+
+# 1回の計算で扱う経路の数（経路数 × 銘柄数 × 年数の配列を作るため）
+CHUNK_PATHS = 20000
+
+# 計算に使うプロセス数（1 の場合は同じプロセスで計算する）
+WORKERS = int(os.environ.get('MONTECARLO_WORKERS', 1))
+
+# 分布のグラフの区間の数
+HISTOGRAM_BINS = 50
+
+# 過去の配当金の推移を取り出す HistoryStore の指標
+DIVIDEND_METRIC = '配当金'
+
+
+def dividend_growth(history, rows=None):
+    # 前年比の対数成長率の平均と標準偏差（history は HistoryStore、比較できる年が2つ未満の銘柄は NaN）
+    _, values = history.matrix(DIVIDEND_METRIC, rows=rows)
+    growth = log_growth(values)
+    counts = np.sum(~np.isnan(growth), axis=1)
+    mean = np.full(len(values), np.nan)
+    vol = np.full(len(values), np.nan)
+    enough = counts >= 2
+    mean[enough] = np.nanmean(growth[enough], axis=1)
+    vol[enough] = np.nanstd(growth[enough], axis=1, ddof=1)
+    return mean, vol
+
+
+def latest_dividend(history, rows=None):
+    # 最も新しい年度の配当金（欠損の年度は飛ばす）
+    return history.latest(DIVIDEND_METRIC, rows)
+
+
+def _simulate_chunk(seed, n_paths, market_values, dividends, growth_mean, growth_vol, price_drift, price_vol, years, correlation):
+    # (経路数, 年数, 銘柄数) の乱数で株価と配当金の推移をまとめて計算する
+    rng = np.random.default_rng(seed)
+    n = len(market_values)
+
+    # 市場全体の共通要因で銘柄間の相関を表す
+    market = rng.standard_normal((n_paths, years, 1))
+    own = rng.standard_normal((n_paths, years, n))
+    price_shocks = np.sqrt(correlation) * market + np.sqrt(1 - correlation) * own
+    dividend_shocks = rng.standard_normal((n_paths, years, n))
+
+    log_prices = np.cumsum((price_drift - price_vol ** 2 / 2) + price_vol * price_shocks, axis=1)
+    end_values = market_values * np.exp(log_prices[:, -1, :])
+
+    log_dividends = np.cumsum(growth_mean + growth_vol * dividend_shocks, axis=1)
+    mean_dividends = dividends * np.exp(log_dividends).mean(axis=1)
+    return end_values, mean_dividends
+
+
+def simulate(market_values, dividends, growth_mean, growth_vol, price_drift=0.0, price_vol=0.2, years=5,
+             n_paths=100000, correlation=0.3, seed=None, workers=WORKERS):
+    """
+    銘柄ごとに株価と配当金の推移を n_paths 通り生成し、
+    (期末の時価, 期間中の年間配当金の平均) をそれぞれ (経路数, 銘柄数) の配列で返す。
+    """
+    market_values = np.nan_to_num(np.asarray(market_values, dtype=float))
+    dividends = np.nan_to_num(np.asarray(dividends, dtype=float))
+    growth_mean = np.nan_to_num(np.asarray(growth_mean, dtype=float))
+    growth_vol = np.nan_to_num(np.asarray(growth_vol, dtype=float))
+
+    # 経路を一定数ごとに分け、それぞれに独立した乱数の種を割り当てる（並列数によらず同じ結果になる）
+    sizes = [min(CHUNK_PATHS, n_paths - start) for start in range(0, n_paths, CHUNK_PATHS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(chunk_seed, size, market_values, dividends, growth_mean, growth_vol, price_drift, price_vol, years, correlation)
+            for chunk_seed, size in zip(seeds, sizes)]
+
+    if workers > 1 and len(args) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_simulate_chunk, *zip(*args)))
+    else:
+        results = [_simulate_chunk(*arg) for arg in args]
+
+    end_values = np.concatenate([result[0] for result in results])
+    mean_dividends = np.concatenate([result[1] for result in results])
+    return end_values, mean_dividends
+
+
+def histogram(outcomes, bins=HISTOGRAM_BINS):
+    # 複数の系列を同じ区間で数える（グラフには経路ごとの値ではなく区間ごとの件数だけを送る）
+    values = np.concatenate(list(outcomes.values()))
+    edges = np.histogram_bin_edges(values, bins=bins, range=(np.percentile(values, 0.5), np.percentile(values, 99.5)))
+    return edges, {name: np.histogram(series, bins=edges)[0] for name, series in outcomes.items()}
+
+
+def percentile_table(outcomes):
+    # {系列名: 経路ごとの値} からパーセンタイルの表を作る
+    return pd.DataFrame({name: np.percentile(values, PERCENTILES) for name, values in outcomes.items()},
+                        index=[f'{p}%' for p in PERCENTILES])
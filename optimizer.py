@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+# 予算を何マスに分けて計算するか（多いほど正確だが遅くなる）
+BUDGET_CELLS = 2000
+
+# 結果に含める列
+RESULT_COLUMNS = ['企業名', '業種', '株価', '1株当たり配当金', '合計スコア']
+
+
+def _split_counts(counts):
+    # 上限 n 個の品物を 1, 2, 4, ..., 残り の組に分けて 0/1 ナップサックとして扱う
+    pieces = []
+    for item, count in enumerate(counts):
+        size = 1
+        while count > 0:
+            take = min(size, count)
+            pieces.append((item, take))
+            count -= take
+            size *= 2
+    return pieces
+
+
+class _GroupKnapsack:
+    # 1つの業種の中での個数制限付きナップサック（dp[c] は c マス以内で得られる配当金の最大値）
+
+    def __init__(self, items, lot_prices, values, counts, capacity, unit):
+        self.items = items
+        # 金額は組ごとにマス単位に切り上げるため、求めた組み合わせは必ず予算内に収まる
+        self.pieces = [(items[i], take, int(np.ceil(lot_prices[i] * take / unit)), values[i] * take)
+                       for i, take in _split_counts(counts)]
+        self.dp = np.zeros(capacity + 1)
+        self.keep = np.zeros((len(self.pieces), capacity + 1), dtype=bool)
+        for p, (_, _, cost, value) in enumerate(self.pieces):
+            if cost > capacity:
+                continue
+            candidate = np.full(capacity + 1, -np.inf)
+            candidate[cost:] = self.dp[:capacity + 1 - cost] + value
+            better = candidate > self.dp
+            self.keep[p] = better
+            self.dp = np.where(better, candidate, self.dp)
+
+    def solution(self, cells, lots):
+        # c マスを使ったときに選んだ品物を lots に加算する
+        for p in range(len(self.pieces) - 1, -1, -1):
+            if self.keep[p, cells]:
+                item, take, cost, _ = self.pieces[p]
+                lots[item] += take
+                cells -= cost
+
+
+def optimize_portfolio(candidates, budget, lot_size=1, max_weight=1.0, min_score=None, industry_caps=None, cells=BUDGET_CELLS):
+    """
+    予算を複数の候補に分けて、推定配当金が最大になる購入株数を求める。
+    lot_size: 売買単位の株数、max_weight: 1銘柄あたりの予算に対する上限の割合、
+    industry_caps: {業種: 予算に対する上限の割合}
+    """
+    industry_caps = industry_caps or {}
+    prices = pd.to_numeric(candidates['株価'], errors='coerce').to_numpy(dtype=float)
+    dividends = pd.to_numeric(candidates['1株当たり配当金'], errors='coerce').to_numpy(dtype=float)
+    industries = candidates['業種'].to_numpy()
+
+    usable = np.isfinite(prices) & (prices > 0) & np.isfinite(dividends) & (dividends > 0)
+    if min_score is not None:
+        usable &= pd.to_numeric(candidates['合計スコア'], errors='coerce').to_numpy(dtype=float) >= min_score
+
+    lots = np.zeros(len(candidates), dtype=np.int64)
+    if budget > 0 and usable.any():
+        unit = budget / cells
+        lot_prices = np.where(usable, prices, 1.0) * lot_size
+        values = np.where(usable, dividends, 0) * lot_size
+        max_lots = np.where(usable, np.floor(budget * min(max_weight, 1.0) / lot_prices), 0).astype(np.int64)
+        usable &= max_lots > 0
+
+        # 上限のある業種はそれぞれ1つのグループ、それ以外の業種（業種が空欄の候補も含む）はまとめて1つのグループにする
+        # グループごとに計算してから、グループの間で予算の配分を決める（配分の計算はグループの数だけかかる）
+        capped = {industry: cap for industry, cap in industry_caps.items() if cap < 1.0}
+        in_capped = pd.Series(industries).isin(list(capped)).to_numpy()
+        group_items = [(np.flatnonzero(usable & ~in_capped), 1.0)]
+        group_items += [(np.flatnonzero(usable & (industries == industry)), cap) for industry, cap in capped.items()]
+
+        groups = []
+        for items, cap in group_items:
+            if not len(items):
+                continue
+            capacity = int(cells * cap)
+            group = _GroupKnapsack(items, lot_prices[items], values[items], max_lots[items], capacity, unit)
+            dp = np.full(cells + 1, group.dp[-1])
+            dp[:capacity + 1] = group.dp
+            groups.append((group, dp))
+
+        # total[c] = max_k (これまでのグループで c - k マス + このグループで k マス)
+        c = np.arange(cells + 1)
+        total = groups[0][1] if groups else np.zeros(cells + 1)
+        # 最初のグループには全てのマスを割り当てる
+        splits = [c]
+        for _, dp in groups[1:]:
+            k = np.arange(cells + 1)
+            combined = np.where(k[None, :] <= c[:, None], total[np.clip(c[:, None] - k[None, :], 0, None)] + dp[None, :], -np.inf)
+            split = combined.argmax(axis=1)
+            splits.append(split)
+            total = combined[c, split]
+
+        remaining = cells
+        for (group, dp), split in zip(reversed(groups), reversed(splits)):
+            used = int(split[remaining])
+            group.solution(min(used, len(group.dp) - 1), lots)
+            remaining -= used
+
+        _fill_remaining(lots, prices, dividends, industries, usable, budget, lot_size, max_weight, industry_caps)
+
+    shares = lots * lot_size
+    selected = shares > 0
+    columns = [column for column in RESULT_COLUMNS if column in candidates.columns]
+    result = candidates[columns].reset_index(drop=True)[selected].copy()
+    result['購入株数'] = shares[selected]
+    result['購入金額'] = shares[selected] * prices[selected]
+    result['推定配当金'] = shares[selected] * dividends[selected]
+    result['構成比'] = result['購入金額'] / budget if budget > 0 else 0.0
+    return result.sort_values('推定配当金', ascending=False)
+
+
+def _fill_remaining(lots, prices, dividends, industries, usable, budget, lot_size, max_weight, industry_caps):
+    # マス単位に切り上げた分の余った予算で、利回りの高い順に買い増す
+    lot_prices = np.where(usable, prices, 0) * lot_size
+    spent = lot_prices * lots
+    left = budget - spent.sum()
+    for item in np.argsort(-np.where(usable, dividends / np.where(usable, prices, 1), -np.inf)):
+        if not usable[item] or left < lot_prices[item]:
+            continue
+        industry_spent = spent[industries == industries[item]].sum()
+        room = min(left,
+                   budget * max_weight - spent[item],
+                   budget * industry_caps.get(industries[item], 1.0) - industry_spent)
+        extra = int(room // lot_prices[item])
+        if extra > 0:
+            lots[item] += extra
+            spent[item] += extra * lot_prices[item]
+            left -= extra * lot_prices[item]
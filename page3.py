@@ -1,130 +1,254 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-import matplotlib.font_manager as fm
-import matplotlib.ticker as ticker
-import os
-
-# フォントファイルのパスを指定
-font_path = 'msgothic.ttc'
-if not os.path.exists(font_path):
-    st.error("フォントファイルが見つかりません。")
-else:
-    st.success("フォントファイルが見つかりました。")
+import pandas as pd
+from chart_display import show_chart
+from data_grid import show_grid
+from fonts import get_font
+from history import DIVIDEND_AVERAGE_YEARS
+from montecarlo import dividend_growth, histogram, latest_dividend, percentile_table, simulate
+from perf import span
+from simulation import AFTER_TAX_RATIO
+
+
+# 全ての買い替え先候補を購入金額ごとにまとめて比較する
+def show_candidate_sweep(derived, scoring_params, purchase_amount, max_purchase_amount, held_market_value, held_dividends):
+    step = st.number_input("購入金額の刻み（円）", min_value=100000, value=1000000, step=100000)
+    # 保有有価証券と刻みが変わらなければ、前回の計算結果をそのまま使う
+    sweep = derived.get('candidate_sweep', max_purchase_amount=max_purchase_amount, step=step, **scoring_params)
+    st.write(f"{len(sweep.candidates):,} 件の候補 × {len(sweep.amounts):,} 通りの購入金額を計算しました。")
+
+    st.write(f"### 購入金額 {purchase_amount:,} 円での候補一覧")
+    table = sweep.table(purchase_amount, held_market_value, held_dividends)
+    show_grid(table, 'page3_sweep',
+              formats={column: '{:,.0f}' for column in ['株価', '購入株数', '購入金額', '推定配当金', '時価の変化', '配当金の変化']})
+
+    st.write("### 時価と配当金の効率的な組み合わせ")
+    frontier = sweep.frontier()
+    show_chart('frontier', market_values=frontier['時価'].tolist(), dividends=frontier['推定配当金'].tolist(),
+               labels=frontier['企業名'].astype(str).tolist())
+    st.dataframe(frontier.style.format({'購入金額上限': '{:,.0f}', '時価': '{:,.0f}', '推定配当金': '{:,.0f}'}))
+
+
+# 購入可能な上限金額を複数の候補に分けて、推定配当金が最大になる組み合わせを求める
+def show_portfolio_optimizer(derived, scoring_params, page2_df, max_purchase_amount, held_market_value, held_dividends,
+                             held_label):
+    lot_size = st.radio("売買単位", [1, 100], format_func=lambda x: f"{x} 株", horizontal=True)
+    max_weight = st.slider("1銘柄あたりの上限（%）", min_value=5, max_value=100, value=30, step=5)
+    min_score = st.number_input("合計スコアの下限", min_value=0.0, value=0.0, step=1.0)
+
+    st.write("業種ごとの上限（%）")
+    industries = pd.unique(page2_df['業種'].dropna())
+    caps = st.data_editor(pd.DataFrame({'業種': industries, '上限（%）': 100}), disabled=['業種'], hide_index=True,
+                          column_config={'上限（%）': st.column_config.NumberColumn(min_value=0, max_value=100, step=5)})
+    industry_caps = tuple((row['業種'], row['上限（%）'] / 100) for _, row in caps.iterrows() if row['上限（%）'] < 100)
+
+    # 条件が変わらなければ前回の計算結果をそのまま使う（他の入力を変えただけでは計算し直さない）
+    portfolio = derived.get('portfolio', budget=max_purchase_amount, lot_size=lot_size, max_weight=max_weight / 100,
+                            min_score=min_score or None, industry_caps=industry_caps, **scoring_params)
+    if portfolio.empty:
+        st.warning("条件を満たす買い替え先がありません。")
+        return
+
+    new_market_value = portfolio['購入金額'].sum()
+    new_dividends = portfolio['推定配当金'].sum()
+    st.write("### 買い替え先の組み合わせ")
+    st.dataframe(portfolio.style.format({'株価': '{:,.0f}', '購入株数': '{:,.0f}', '購入金額': '{:,.0f}',
+                                         '推定配当金': '{:,.0f}', '構成比': '{:.1%}'}))
+    st.write(f"購入金額の合計: {new_market_value:,.0f} 円（残り {max_purchase_amount - new_market_value:,.0f} 円）")
+
+    st.write("### 時価総額の比較")
+    show_chart('comparison_bar', labels=[held_label, '買い替え後'], values=[held_market_value / 1e6, new_market_value / 1e6],
+               ylabel='価格（百万円）')
+    st.write("### 配当金の比較")
+    show_chart('comparison_bar', labels=[held_label, '買い替え後'], values=[held_dividends, new_dividends],
+               ylabel='配当金（円）', tick_step=500000)
+
+
+# 株価と配当金の将来の推移を多数のシナリオで計算し、買い替え前後の分布を比較する
+def show_scenarios(held_security_data, history, held_positions, held_label, new_market_value, new_dividends, new_label):
+    years = st.slider("期間（年）", min_value=1, max_value=10, value=5)
+    n_paths = st.selectbox("シナリオの数", [10000, 100000], format_func=lambda x: f"{x:,}")
+    price_vol = st.slider("株価の変動率（年率 %）", min_value=0, max_value=60, value=20) / 100
+    dividend_vol = st.slider("配当金の変動率（年率 %）", min_value=0, max_value=60, value=10) / 100
+    correlation = st.slider("銘柄間の相関", min_value=0.0, max_value=1.0, value=0.3, step=0.1)
+    use_history = st.checkbox("保有有価証券の配当金の変動は過去の配当金から推定する", value=True)
+
+    # 保有有価証券は過去の配当金から成長率と変動率を推定し、推定できない場合は入力した変動率を使う
+    growth_mean, growth_vol = dividend_growth(history, held_positions)
+    if not use_history:
+        growth_mean[:] = 0.0
+        growth_vol[:] = dividend_vol
+    growth_mean = np.append(np.nan_to_num(growth_mean), 0.0)
+    growth_vol = np.append(np.where(np.isnan(growth_vol), dividend_vol, growth_vol), dividend_vol)
+
+    market_values = np.append(held_security_data['時価'].to_numpy(dtype=float), new_market_value)
+    dividends = np.append(latest_dividend(history, held_positions), new_dividends)
+    end_values, mean_dividends = simulate(market_values, dividends, growth_mean, growth_vol, price_vol=price_vol,
+                                          years=years, n_paths=n_paths, correlation=correlation, seed=0)
+
+    held_values = end_values[:, :-1].sum(axis=1)
+    held_dividends = mean_dividends[:, :-1].sum(axis=1)
+    st.write(f"### {years}年後の時価と年間配当金の分布（{n_paths:,} 通り）")
+    table = percentile_table({
+        f'時価（{held_label}）': held_values,
+        f'時価（{new_label}）': end_values[:, -1],
+        f'年間配当金（{held_label}）': held_dividends,
+        f'年間配当金（{new_label}）': mean_dividends[:, -1],
+    })
+    st.dataframe(table.style.format('{:,.0f}'))
+    st.write(f"買い替え後の年間配当金が保有を続けた場合を上回る確率: {(mean_dividends[:, -1] > held_dividends).mean():.1%}")
+
+    for title, held, new in [('時価', held_values, end_values[:, -1]), ('年間配当金', held_dividends, mean_dividends[:, -1])]:
+        edges, counts = histogram({held_label: held, new_label: new})
+        show_chart('histogram', edges=edges.tolist(), xlabel=f'{title}（円）',
+                   series=[(counts[held_label].tolist(), held_label, 'blue'), (counts[new_label].tolist(), new_label, 'green')])
 
-prop = fm.FontProperties(fname=font_path)
 
 def show():
     # Session stateからPage1とPage2のデータを取得
     page1_df = st.session_state.get('page1_data')
-    page2_df = st.session_state.get('page2_data')
+    derived = st.session_state.get('derived')
 
-    if page1_df is None or page2_df is None:
+    if page1_df is None or derived is None or derived.version('page2_data') is None:
         st.error("Page1とPage2のデータが必要です。データをアップロードしてください。")
+        missing = st.session_state.get('missing_sheets')
+        if missing:
+            st.warning(f"アップロードされたワークブックにないシート: {', '.join(missing.values())}")
     else:
+        # 株価・配当金を数値に変換済みのデータを使う
+        scoring_params = st.session_state.get('scoring_params', {})
+        page2_df = derived.get('page2_scored', **scoring_params)
+
         st.title("有価証券の買い替えシミュレーション")
 
         # 保有する有価証券を複数選択
-        held_securities = st.multiselect("保有する有価証券を選択", page1_df['企業名'])
+        page1_index = derived.get('page1_companies')
+        page2_index = derived.get('page2_companies')
+        held_securities = st.multiselect("保有する有価証券を選択", page1_index.names)
 
         if not held_securities:
             st.error("少なくとも1つの保有有価証券を選択してください。")
             return
 
+        # 配当金平均に使う年数（直近の年度から数える）
+        history = derived.get('page1_history')
+        dividend_years = history.years('配当金')
+        if dividend_years:
+            average_years = st.number_input(f"配当金平均の年数（{dividend_years[0]}〜{dividend_years[-1]}年度のうち直近）",
+                                            min_value=1, max_value=len(dividend_years),
+                                            value=min(DIVIDEND_AVERAGE_YEARS, len(dividend_years)))
+        else:
+            average_years = None
+
         # 保有有価証券のデータを取得
-        held_security_data = page1_df[page1_df['企業名'].isin(held_securities)]
+        with span('Page 3', '保有有価証券の集計'):
+            held_positions = page1_index.row_positions(held_securities, in_frame_order=True)
+            held_security_data = page1_df.iloc[held_positions].copy()
 
-        # 2020～2023年の配当金の平均を算出
-        held_security_data['配当金平均'] = held_security_data[['配当金2020', '配当金2021', '配当金2022', '配当金2023']].mean(axis=1)
+            # 直近 average_years 年の配当金の平均を算出
+            held_security_data['配当金平均'] = history.stats('配当金', average_years, held_positions)['平均'].to_numpy()
 
         # 保有有価証券の時価総額の合計
         held_market_value = held_security_data['時価'].sum()
         st.write(f"選択した保有有価証券の時価総額: {held_market_value:,.0f} 円")
 
         # 時価の3割減少した金額を上限
-        max_purchase_amount = held_market_value * 0.7
+        max_purchase_amount = held_market_value * AFTER_TAX_RATIO
         st.write(f"購入可能な上限金額（時価の3割減少した金額）: {max_purchase_amount:,.0f} 円")
 
         # 購入金額のスライダー（100万円単位）
         purchase_amount = st.slider("購入金額", min_value=0, max_value=int(max_purchase_amount), step=1000000, format="%d")
         st.write(f"選択された購入金額: {purchase_amount:,} 円")
 
+        mode = st.radio("シミュレーションの方法", ["買い替え先を1つ選択", "全ての候補を比較", "複数の候補に分散"], horizontal=True)
+        if mode == "全ての候補を比較":
+            with span('Page 3', '全ての候補の比較'):
+                show_candidate_sweep(derived, scoring_params, purchase_amount, max_purchase_amount, held_market_value,
+                                     held_security_data['配当金平均'].sum())
+            return
+        if mode == "複数の候補に分散":
+            with span('Page 3', '複数の候補への分散'):
+                show_portfolio_optimizer(derived, scoring_params, page2_df, max_purchase_amount, held_market_value,
+                                         held_security_data['配当金平均'].sum(), ', '.join(held_securities))
+            return
+
         # 買い替え先の有価証券を選択
-        new_security = st.selectbox("買い替え先の有価証券を選択", page2_df['企業名'])
-
-        # 買い替え先有価証券のデータを取得
-        new_security_data = page2_df[page2_df['企業名'] == new_security].iloc[0]
-
-        # 新しい有価証券の購入株数
-        new_purchase_shares = purchase_amount // new_security_data['株価']
-
-        # 新しい有価証券の配当金
-        new_dividends = new_purchase_shares * new_security_data['1株当たり配当金']
-
-        # 結果をテーブル形式で表示
-        result_data = {
-            '項目': ['新しい有価証券の購入株数', '新しい有価証券の配当金'],
-            '値': [f'{new_purchase_shares:,} 株', f'{new_dividends:,.0f} 円']
-        }
-        result_df = pd.DataFrame(result_data)
-        st.write("### 買い替えシミュレーション結果")
-        st.table(result_df)
-
-        # 保有有価証券ごとの計算結果をテーブル形式で表示
-        held_securities_data = []
-        for _, row in held_security_data.iterrows():
-            held_securities_data.append({
-                '企業名': row['企業名'],
-                '時価': f"{row['時価']:,.0f} 円",
-                '配当金平均': f"{row['配当金平均']:,.0f} 円"
+        new_security = st.selectbox("買い替え先の有価証券を選択", page2_index.names)
+
+        # 買い替え先有価証券のデータを取得（同じ企業名の行が複数ある場合は選択してもらう）
+        positions = page2_index.positions(new_security)
+        if len(positions) > 1:
+            st.warning(f"「{new_security}」の行が {len(positions)} 件あります。使用する行を選択してください。")
+            choice = st.radio("使用する行", range(len(positions)),
+                              format_func=lambda i: f"{i + 1}件目（株価 {page2_df['株価'].iloc[positions[i]]:,.0f} 円）")
+            position = positions[choice]
+        else:
+            position = positions[0]
+        new_security_data = page2_df.iloc[position]
+
+        with span('Page 3', '買い替えの計算'):
+            # 新しい有価証券の購入株数
+            new_purchase_shares = purchase_amount // new_security_data['株価']
+
+            # 新しい有価証券の配当金
+            new_dividends = new_purchase_shares * new_security_data['1株当たり配当金']
+
+            # 結果をテーブル形式で表示
+            result_data = {
+                '項目': ['新しい有価証券の購入株数', '新しい有価証券の配当金'],
+                '値': [f'{new_purchase_shares:,} 株', f'{new_dividends:,.0f} 円']
+            }
+            result_df = pd.DataFrame(result_data)
+            st.write("### 買い替えシミュレーション結果")
+            st.table(result_df)
+
+            # 保有有価証券ごとの計算結果をテーブル形式で表示
+            held_securities_data = []
+            for _, row in held_security_data.iterrows():
+                held_securities_data.append({
+                    '企業名': row['企業名'],
+                    '時価': f"{row['時価']:,.0f} 円",
+                    '配当金平均': f"{row['配当金平均']:,.0f} 円"
+                })
+
+            detailed_df = pd.DataFrame(held_securities_data)
+            st.write("### 保有有価証券ごとの計算結果")
+            st.table(detailed_df)
+
+        if not get_font().available:
+            st.error("フォントファイルが見つかりません。")
+
+        with span('Page 3', '比較グラフ'):
+            # グラフやテーブルで結果を視覚的に表示
+            st.write("### 時価総額の比較")
+            categories = [', '.join(held_securities), new_security]
+            values = [held_market_value / 1e6, new_purchase_shares * new_security_data['株価'] / 1e6]  # 百万円単位に変換
+            show_chart('comparison_bar', labels=categories, values=values, ylabel='価格（百万円）')
+
+            st.write("### 配当金の比較")
+            categories = [', '.join(held_securities), new_security]
+            values = [held_security_data['配当金平均'].sum(), new_dividends]  # 円単位
+            show_chart('comparison_bar', labels=categories, values=values, ylabel='配当金（円）',
+                       tick_step=500000)  # 50万円刻みの表示に設定
+
+            # 計算結果のテーブル表示
+            st.write("### 計算結果")
+            result_df = pd.DataFrame({
+                '項目': ['時価総額', '配当金'],
+                f'保有有価証券（{", ".join(held_securities)}）': [held_market_value, held_security_data['配当金平均'].sum()],
+                f'新しい有価証券（{new_security}）': [new_purchase_shares * new_security_data['株価'], new_dividends],
+                '変化': [(new_purchase_shares * new_security_data['株価']) - held_market_value, new_dividends - held_security_data['配当金平均'].sum()]
             })
-
-        detailed_df = pd.DataFrame(held_securities_data)
-        st.write("### 保有有価証券ごとの計算結果")
-        st.table(detailed_df)
-
-        # グラフやテーブルで結果を視覚的に表示
-        st.write("### 時価総額の比較")
-        fig, ax = plt.subplots()
-        categories = [', '.join(held_securities), new_security]
-        values = [held_market_value / 1e6, new_purchase_shares * new_security_data['株価'] / 1e6]  # 百万円単位に変換
-        bars = ax.bar(categories, values, color=['blue', 'green'])
-        ax.set_ylabel('価格（百万円）', fontproperties=prop)
-        ax.set_xticklabels(categories, fontproperties=prop)
-        for bar in bars:
-            height = bar.get_height()
-            ax.annotate(f'{height:,.0f}', xy=(bar.get_x() + bar.get_width() / 2, height),
-                        xytext=(0, 3), textcoords="offset points", ha='center', va='bottom', fontproperties=prop)
-        st.pyplot(fig)
-
-        st.write("### 配当金の比較")
-        fig, ax = plt.subplots()
-        categories = [', '.join(held_securities), new_security]
-        values = [held_security_data['配当金平均'].sum(), new_dividends]  # 円単位
-        bars = ax.bar(categories, values, color=['blue', 'green'])
-        ax.set_ylabel('配当金（円）', fontproperties=prop)
-        ax.set_xticklabels(categories, fontproperties=prop)
-        ax.yaxis.set_major_locator(ticker.MultipleLocator(500000))  # 50万円刻みの表示に設定
-        ax.yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f'{x:,.0f}'))
-        for bar in bars:
-            height = bar.get_height()
-            ax.annotate(f'{height:,.0f}', xy=(bar.get_x() + bar.get_width() / 2, height),
-                        xytext=(0, 3), textcoords="offset points", ha='center', va='bottom', fontproperties=prop)
-        st.pyplot(fig)
-
-        # 計算結果のテーブル表示
-        st.write("### 計算結果")
-        result_df = pd.DataFrame({
-            '項目': ['時価総額', '配当金'],
-            f'保有有価証券（{", ".join(held_securities)}）': [held_market_value, held_security_data['配当金平均'].sum()],
-            f'新しい有価証券（{new_security}）': [new_purchase_shares * new_security_data['株価'], new_dividends],
-            '変化': [(new_purchase_shares * new_security_data['株価']) - held_market_value, new_dividends - held_security_data['配当金平均'].sum()]
-        })
-        result_df[f'保有有価証券（{", ".join(held_securities)}）'] = result_df[f'保有有価証券（{", ".join(held_securities)}）'].apply(lambda x: f'{x:,.0f} 円')
-        result_df[f'新しい有価証券（{new_security}）'] = result_df[f'新しい有価証券（{new_security}）'].apply(lambda x: f'{x:,.0f} 円')
-        result_df['変化'] = result_df['変化'].apply(lambda x: f'{x:,.0f} 円')
-        st.dataframe(result_df)
+            result_df[f'保有有価証券（{", ".join(held_securities)}）'] = result_df[f'保有有価証券（{", ".join(held_securities)}）'].apply(lambda x: f'{x:,.0f} 円')
+            result_df[f'新しい有価証券（{new_security}）'] = result_df[f'新しい有価証券（{new_security}）'].apply(lambda x: f'{x:,.0f} 円')
+            result_df['変化'] = result_df['変化'].apply(lambda x: f'{x:,.0f} 円')
+            st.dataframe(result_df)
+
+        # 将来の株価と配当金の変動を考慮したシナリオ分析
+        if st.checkbox("シナリオ分析（株価と配当金の変動を考慮）"):
+            with span('Page 3', 'シナリオ分析'):
+                show_scenarios(held_security_data, history, held_positions, ', '.join(held_securities),
+                               new_purchase_shares * new_security_data['株価'], new_dividends, new_security)
 
 if __name__ == "__main__":
     show()
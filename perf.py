@@ -0,0 +1,117 @@
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+if not logger.handlers:
+    # 計測結果は1行1件のJSONとして標準エラーに出力する
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# モジュールはプロセス内で1回だけ読み込まれるため、最初の実行かどうかの判定に使う
+_first_run_done = False
+
+# 直近の計測結果
+STARTUP_TIMINGS = []
+CHART_TIMINGS = []
+MAX_TIMINGS = 100
+
+# (ページ, 段階) ごとの直近の処理時間（ミリ秒）。p50 / p95 の計算に使う
+SPAN_TIMINGS = {}
+_span_lock = threading.Lock()
+
+# 実行中のスクリプトで計測した段階（Streamlit は実行ごとに別のスレッドでスクリプトを動かす）
+_current = threading.local()
+
+
+def _record(timings, timing):
+    timings.append(timing)
+    del timings[:-MAX_TIMINGS]
+    logger.info(json.dumps(timing, ensure_ascii=False))
+
+
+def record_span(page, stage, elapsed_ms):
+    with _span_lock:
+        SPAN_TIMINGS.setdefault((page, stage), deque(maxlen=MAX_TIMINGS)).append(elapsed_ms)
+    if not hasattr(_current, 'spans'):
+        _current.spans = []
+    _current.spans.append({'page': page, 'stage': stage, 'elapsed_ms': round(elapsed_ms, 1)})
+
+
+@contextmanager
+def span(page, stage):
+    # with ブロックの処理時間を段階として記録する
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(page, stage, (time.perf_counter() - start) * 1000)
+
+
+def _take_spans():
+    spans = getattr(_current, 'spans', [])
+    _current.spans = []
+    return spans
+
+
+def _percentile(values, q):
+    # 最近傍順位法によるパーセンタイル
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def span_summary(spans):
+    # 今回計測した段階ごとに、今回の時間と直近の p50 / p95 を返す
+    rows = []
+    for s in spans:
+        with _span_lock:
+            history = list(SPAN_TIMINGS.get((s['page'], s['stage']), []))
+        rows.append({
+            'page': s['page'],
+            'stage': s['stage'],
+            'elapsed_ms': s['elapsed_ms'],
+            'p50_ms': round(_percentile(history, 50), 1) if history else None,
+            'p95_ms': round(_percentile(history, 95), 1) if history else None,
+            'count': len(history),
+        })
+    return rows
+
+
+def record_startup(script_start, imports_done, page, page_import_ms):
+    # スクリプトの実行開始から描画完了までの時間を、今回計測した段階とあわせて記録する
+    global _first_run_done
+    now = time.perf_counter()
+    total_ms = (now - script_start) * 1000
+    record_span(page, '合計', total_ms)
+    timing = {
+        'event': 'cold_start' if not _first_run_done else 'rerun',
+        'page': page,
+        'import_ms': round((imports_done - script_start) * 1000, 1),
+        'page_import_ms': round(page_import_ms, 1),
+        'total_ms': round(total_ms, 1),
+        'spans': _take_spans(),
+    }
+    _first_run_done = True
+    _record(STARTUP_TIMINGS, timing)
+    return timing
+
+
+def record_chart(backend, chart_type, elapsed_ms, payload_bytes):
+    # 描画方式ごとのグラフの処理時間とブラウザへの送信サイズを記録する
+    timing = {
+        'event': 'chart',
+        'backend': backend,
+        'chart': chart_type,
+        'elapsed_ms': round(elapsed_ms, 1),
+        'payload_bytes': payload_bytes,
+    }
+    _record(CHART_TIMINGS, timing)
+    record_span('chart', f'{chart_type} ({backend})', elapsed_ms)
+    return timing
@@ -0,0 +1,244 @@
+# スコア一覧・トップ10・業種別平均・グラフをまとめたレポート（XLSX と PDF）をバックグラウンドのスレッドで作成する
+import io
+import os
+import tempfile
+import threading
+import weakref
+
+from charts import render_chart, rendered_figure
+from fonts import font_prop
+from indexes import LOWER_IS_BETTER
+from scoring import SCORE_COLUMNS, score_lists
+
+TOP_K = 10
+
+# 1回に書き出す行数（表全体を Python のオブジェクトに変換しないため）
+WRITE_CHUNK_ROWS = 5000
+
+# グラフの画像を XLSX に貼り付けるときの縮小率（画像は dpi=200 で作成している）
+IMAGE_SCALE = 0.4
+IMAGE_ROWS = 28
+
+# 業種別スコア平均のレーダーチャートを1つの図に並べる業種の数
+INDUSTRIES_PER_CHART = 6
+
+# PDF の1ページに載せる表の行数
+PDF_TABLE_ROWS = 25
+
+MIME_TYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'pdf': 'application/pdf',
+}
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def _cell_values(series):
+    # 欠損値は空欄にし、numpy の値は Python の値にする
+    values = series.astype(object).to_numpy(copy=True)
+    values[series.isna().to_numpy()] = None
+    return values
+
+
+def _frame_rows(df, cancelled=None):
+    for start in range(0, len(df), WRITE_CHUNK_ROWS):
+        if cancelled is not None and cancelled():
+            raise ExportCancelled()
+        chunk = df.iloc[start:start + WRITE_CHUNK_ROWS]
+        yield from zip(*[_cell_values(chunk[column]) for column in chunk.columns])
+
+
+def _top_tables(derived, scoring_params):
+    # (表の見出し, 表) のリスト
+    rankings = derived.get('page1_rankings')
+    page1_tops = [(f"トップ{TOP_K}企業（{metric}・{'低い順' if metric in LOWER_IS_BETTER else '高い順'}）",
+                   rankings.top(metric, TOP_K, metric in LOWER_IS_BETTER, columns=['企業名', metric]))
+                  for metric in rankings.metrics]
+    page2_scored = derived.get('page2_scored', **scoring_params)
+    page2_top = page2_scored.sort_values('合計スコア', ascending=False, kind='stable', na_position='last').head(TOP_K)
+    page2_tops = [(f"トップ{TOP_K}企業（合計スコア）", page2_top[['企業名', '業種'] + SCORE_COLUMNS + ['合計スコア']])]
+    return page1_tops, page2_tops, page2_top
+
+
+def _chart_params(industry_means, page2_top):
+    # (グラフの見出し, グラフの種類, 引数) のリスト
+    charts = []
+    for start in range(0, len(industry_means), INDUSTRIES_PER_CHART):
+        page_means = industry_means.iloc[start:start + INDUSTRIES_PER_CHART]
+        charts.append((f"業種別スコア平均（{start + 1}〜{start + len(page_means)} 業種目）", 'radar_side_by_side',
+                       dict(data=score_lists(page_means), categories=SCORE_COLUMNS,
+                            titles=[f"{industry} 業種別スコア平均" for industry in page_means.index], chart_size=(4, 4))))
+    labels = page2_top['企業名'].astype(str).tolist()
+    charts.append((f"株価の比較（合計スコアのトップ{TOP_K}）", 'bar',
+                   dict(labels=labels, series=[(page2_top['株価'].round().tolist(), '株価（円）', 'blue')],
+                        xlabel='企業名', ylabel='株価（円）', title='株価の比較')))
+    charts.append((f"1株当たり配当金の比較（合計スコアのトップ{TOP_K}）", 'bar',
+                   dict(labels=labels,
+                        series=[(page2_top['1株当たり配当金'].round().tolist(), '1株当たり配当金（円）', 'green')],
+                        xlabel='企業名', ylabel='1株当たり配当金（円）', title='1株当たり配当金の比較')))
+    return charts
+
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class ExportJob:
+    # レポートの作成をバックグラウンドのスレッドで行う（作成したファイルは一時ファイルに保存する）
+
+    def __init__(self, derived, include_pdf=False, scoring_params=None):
+        self.derived = derived
+        self.include_pdf = include_pdf
+        self.scoring_params = scoring_params or {}
+        self.step = None
+        self.progress = 0.0
+        self.files = []
+        self.error = None
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        # ジョブが破棄されたら一時ファイルも削除する
+        self._paths = []
+        self._finalizer = weakref.finalize(self, _remove_files, self._paths)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def done(self):
+        return not self._thread.is_alive()
+
+    def cleanup(self):
+        self._finalizer()
+
+    def _temp_path(self, suffix):
+        fd, path = tempfile.mkstemp(prefix='report_', suffix=suffix)
+        os.close(fd)
+        self._paths.append(path)
+        return path
+
+    def _report(self, step, progress):
+        if self.cancelled:
+            raise ExportCancelled()
+        self.step = step
+        self.progress = progress
+
+    def _run(self):
+        try:
+            self._report('集計', 0.0)
+            page1_scored = self.derived.get('page1_scored', **self.scoring_params)
+            page2_scored = self.derived.get('page2_scored', **self.scoring_params)
+            industry_cube = self.derived.get('page1_industry_cube', **self.scoring_params)
+            industry_means = industry_cube.stat('平均', SCORE_COLUMNS)
+            # 業種別の集計値は「列（統計量）」の1段の列名にして書き出す
+            industry_table = industry_cube.table.copy()
+            industry_table.columns = [f'{column}（{stat}）' for stat, column in industry_table.columns]
+            page1_tops, page2_tops, page2_top = _top_tables(self.derived, self.scoring_params)
+            charts = _chart_params(industry_means, page2_top)
+
+            tables = [
+                ('Page1 スコア', [(None, page1_scored)]),
+                ('Page1 トップ10', page1_tops),
+                ('Page1 業種別平均', [(None, industry_means.reset_index())]),
+                ('Page1 業種別集計', [(None, industry_table.reset_index())]),
+                ('Page2 スコア', [(None, page2_scored)]),
+                ('Page2 トップ10', page2_tops),
+            ]
+            files = [('xlsx', self._write_xlsx(tables, charts))]
+            if self.include_pdf:
+                files.append(('pdf', self._write_pdf(page1_tops + [("業種別スコア平均", industry_means.reset_index())]
+                                                     + page2_tops, charts)))
+            self._report('完了', 1.0)
+            # 全てのファイルができてから結果を公開する
+            self.files = files
+        except ExportCancelled:
+            self.cleanup()
+        except Exception as e:
+            # スレッド内の例外は呼び出し元に伝わらないため、メッセージとして保持する
+            self.error = str(e)
+            self.cleanup()
+
+    def _write_xlsx(self, tables, charts):
+        import xlsxwriter
+
+        path = self._temp_path('.xlsx')
+        # constant_memory では行を上から順に書き出し、書き終えた行はメモリに残さない
+        wb = xlsxwriter.Workbook(path, {'constant_memory': True, 'nan_inf_to_errors': True})
+        try:
+            header_format = wb.add_format({'bold': True})
+            steps = len(tables) + len(charts)
+            done = 0
+            for sheet_name, blocks in tables:
+                self._report(f'XLSX: {sheet_name}', 0.9 * done / steps)
+                ws = wb.add_worksheet(sheet_name)
+                row = 0
+                for title, df in blocks:
+                    if title is not None:
+                        ws.write_string(row, 0, title, header_format)
+                        row += 1
+                    ws.write_row(row, 0, [str(column) for column in df.columns], header_format)
+                    row += 1
+                    for values in _frame_rows(df, self._cancel.is_set):
+                        ws.write_row(row, 0, values)
+                        row += 1
+                    row += 1
+                done += 1
+
+            ws = wb.add_worksheet('グラフ')
+            for i, (title, chart_type, params) in enumerate(charts):
+                self._report(f'XLSX: グラフ ({i + 1}/{len(charts)})', 0.9 * done / steps)
+                ws.write_string(i * IMAGE_ROWS, 0, title, header_format)
+                image = render_chart(chart_type, **params)
+                ws.insert_image(i * IMAGE_ROWS + 1, 0, f'{chart_type}_{i}.png',
+                                {'image_data': io.BytesIO(image), 'x_scale': IMAGE_SCALE, 'y_scale': IMAGE_SCALE})
+                done += 1
+        finally:
+            wb.close()
+        return path
+
+    def _write_pdf(self, tables, charts):
+        from matplotlib.backends.backend_pdf import PdfPages
+        from matplotlib.figure import Figure
+
+        path = self._temp_path('.pdf')
+        prop = font_prop()
+        with PdfPages(path) as pdf:
+            for i, (title, df) in enumerate(tables):
+                self._report(f'PDF: 表 ({i + 1}/{len(tables)})', 0.9)
+                for start in range(0, max(len(df), 1), PDF_TABLE_ROWS):
+                    part = df.iloc[start:start + PDF_TABLE_ROWS]
+                    fig = Figure(figsize=(11.69, 8.27))
+                    ax = fig.add_subplot()
+                    ax.axis('off')
+                    ax.set_title(title, fontproperties=prop)
+                    cells = [['' if value is None else f'{value:,.2f}' if isinstance(value, float) else str(value)
+                              for value in row] for row in _frame_rows(part)]
+                    if cells:
+                        table = ax.table(cellText=cells, colLabels=[str(column) for column in part.columns], loc='upper center')
+                        for cell in table.get_celld().values():
+                            cell.get_text().set_fontproperties(prop)
+                    pdf.savefig(fig)
+
+            for i, (title, chart_type, params) in enumerate(charts):
+                self._report(f'PDF: グラフ ({i + 1}/{len(charts)})', 0.9 + 0.1 * i / len(charts))
+                with rendered_figure(chart_type, **params) as fig:
+                    pdf.savefig(fig, bbox_inches='tight')
+        return path
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+# スコア列（表示順）
+SCORE_COLUMNS = ['自己資本比率スコア', 'ROEスコア', 'ROAスコア', 'PERスコア', 'PBRスコア', '配当利回りスコア']
+
+# スコアごとの (元の指標列, 閾値（昇順）, 判定方向)
+# 'higher': 閾値以上で加点（値が大きいほど高スコア）
+# 'lower' : 閾値未満で加点（値が小さいほど高スコア）
+SCORE_RULES = {
+    '自己資本比率スコア': ('自己資本比率', [20, 40, 60, 80], 'higher'),
+    'ROEスコア': ('ROE', [2, 5, 10, 15], 'higher'),
+    'ROAスコア': ('ROA', [2.5, 5, 7.5, 10], 'higher'),
+    'PERスコア': ('PER', [10, 15, 20, 25], 'lower'),
+    'PBRスコア': ('PBR', [1, 2, 3, 4], 'lower'),
+    '配当利回りスコア': ('配当利回り', [2, 3, 4, 5], 'higher'),
+}
+
+# スコアの計算方法
+# 'absolute'  : 指標ごとの固定の閾値で判定する
+# 'percentile': 業種内の順位（最も悪い値を 1 点、最も良い値を 5 点）
+# 'zscore'    : 業種内の平均からの偏差（平均を 3 点とし、±2 標準偏差で 1〜5 点）
+SCORING_METHODS = {
+    'absolute': '固定の閾値',
+    'percentile': '業種内の順位（パーセンタイル）',
+    'zscore': '業種内の偏差（Zスコア）',
+}
+
+# 業種内の相対スコアも固定の閾値と同じ 1〜5 点の範囲にそろえる
+RELATIVE_SCORE_RANGE = (1, 5)
+Z_SCORE_CLIP = 2.0
+
+
+def score_values(values, thresholds, direction):
+    # 列全体をまとめてスコア化する（欠損値は NaN のまま返す）
+    values = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=float)
+    thresholds = np.asarray(thresholds, dtype=float)
+
+    # side='right' で「値以下の閾値の数」= 「value >= 閾値 を満たす数」になる
+    passed = np.searchsorted(thresholds, values, side='right')
+    if direction == 'higher':
+        scores = 1 + passed
+    else:
+        # value < 閾値 を満たす数 = 閾値の数 - passed
+        scores = len(thresholds) + 1 - passed
+
+    scores = scores.astype(float)
+    scores[np.isnan(values)] = np.nan
+    return scores
+
+
+def _score_scalar(score_column, value):
+    if pd.isna(value):
+        return None
+    _, thresholds, direction = SCORE_RULES[score_column]
+    return int(score_values([value], thresholds, direction)[0])
+
+
+# 単一の値をスコア化する関数（従来の関数と同じ判定）
+def calculate_self_capital_ratio_score(value):
+    return _score_scalar('自己資本比率スコア', value)
+
+def calculate_roe_score(value):
+    return _score_scalar('ROEスコア', value)
+
+def calculate_roa_score(value):
+    return _score_scalar('ROAスコア', value)
+
+def calculate_per_score(value):
+    return _score_scalar('PERスコア', value)
+
+def calculate_pbr_score(value):
+    return _score_scalar('PBRスコア', value)
+
+def calculate_dividend_yield_score(value):
+    return _score_scalar('配当利回りスコア', value)
+
+
+def relative_score_frame(df, scoring_method, group_column='業種'):
+    # 業種内の順位・偏差からスコアを計算する（業種ごとのループではなく、groupby でフレーム全体をまとめて計算する）
+    sources = [source_column for source_column, _, _ in SCORE_RULES.values()]
+    signs = [1.0 if direction == 'higher' else -1.0 for _, _, direction in SCORE_RULES.values()]
+    # 値が小さいほど良い指標は符号を反転し、全ての指標を大きいほど良い向きにそろえる
+    values = df[sources].apply(pd.to_numeric, errors='coerce').astype(float) * signs
+    values.columns = SCORE_COLUMNS
+    grouped = values.groupby(df[group_column], observed=True, dropna=False)
+
+    low, high = RELATIVE_SCORE_RANGE
+    if scoring_method == 'percentile':
+        # 業種内の順位を 0〜1 にする（同じ値は平均の順位、1社だけの業種は中央）
+        counts = grouped.transform('count')
+        position = (grouped.rank(method='average') - 1) / (counts - 1)
+        position = position.where(counts > 1, 0.5)
+    elif scoring_method == 'zscore':
+        # 業種内の標準偏差が 0 または計算できない場合は平均と同じとみなす
+        std = grouped.transform('std', ddof=0)
+        z = ((values - grouped.transform('mean')) / std.where(std > 0)).fillna(0.0)
+        position = (z.clip(-Z_SCORE_CLIP, Z_SCORE_CLIP) + Z_SCORE_CLIP) / (2 * Z_SCORE_CLIP)
+    else:
+        raise ValueError(f"スコアの計算方法が不明です: {scoring_method}")
+
+    scores = (low + (high - low) * position).round(2)
+    return scores.where(values.notna())
+
+
+def score_frame(df, scoring_method='absolute'):
+    # 6つのスコア列を列単位で計算する（1〜5点のため Int8 で持ち、欠損は <NA>）
+    # 業種内の相対スコアは小数になるため float で持つ
+    if scoring_method not in (None, 'absolute'):
+        return relative_score_frame(df, scoring_method)
+    scores = {}
+    for score_column, (source_column, thresholds, direction) in SCORE_RULES.items():
+        values = score_values(df[source_column], thresholds, direction)
+        scores[score_column] = pd.array(values, dtype='Int8')
+    return pd.DataFrame(scores, index=df.index, columns=SCORE_COLUMNS)
+
+
+def combine_scores(df, scores, weights=None):
+    # 元のデータにスコア列と合計スコアを追加したデータを返す（欠損のスコアは合計に含めない）
+    # weights は SCORE_COLUMNS の順の重み（None は全て 1）
+    combined_df = pd.concat([df, scores], axis=1)
+    if weights is None and all(isinstance(dtype, pd.Int8Dtype) for dtype in scores.dtypes):
+        combined_df['合計スコア'] = combined_df[SCORE_COLUMNS].sum(axis=1).astype('Int8')
+    else:
+        weights = np.ones(len(SCORE_COLUMNS)) if weights is None else np.asarray(weights, dtype=float)
+        values = combined_df[SCORE_COLUMNS].astype(float).to_numpy()
+        combined_df['合計スコア'] = np.round(np.nansum(values * weights, axis=1), 2)
+    return combined_df
+
+
+def score_lists(df, columns=SCORE_COLUMNS):
+    # グラフに渡す行ごとのスコアのリスト（欠損は NaN）
+    values = df[columns].astype(object)
+    return [[float('nan') if pd.isna(value) else value for value in row] for row in values.itertuples(index=False)]
+
+
+def add_scores(df):
+    return combine_scores(df, score_frame(df))
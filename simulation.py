@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+# 法人税を30%と見積もり、売却した時価の7割を購入に充てる
+AFTER_TAX_RATIO = 0.7
+
+# 購入金額の刻みの数の上限（候補数 × 刻みの数の配列を作るため）
+MAX_AMOUNT_STEPS = 500
+
+
+def amount_grid(max_purchase_amount, step):
+    # 0円から上限までの購入金額の刻み（刻みが多すぎる場合は間隔を広げる）
+    if max_purchase_amount / step > MAX_AMOUNT_STEPS:
+        step = float(np.ceil(max_purchase_amount / MAX_AMOUNT_STEPS / step) * step)
+    return np.arange(0, max_purchase_amount + 1, step, dtype=float)
+
+
+class CandidateSweep:
+    # 全候補 × 全購入金額の購入株数・時価・配当金を配列でまとめて計算する
+
+    def __init__(self, candidates, amounts):
+        self.candidates = candidates
+        self.amounts = np.asarray(amounts, dtype=float)
+
+        prices = pd.to_numeric(candidates['株価'], errors='coerce').to_numpy(dtype=float)
+        dividends_per_share = pd.to_numeric(candidates['1株当たり配当金'], errors='coerce').to_numpy(dtype=float)
+        # 株価が欠損または0以下の候補は購入できない
+        self.valid = np.isfinite(prices) & (prices > 0)
+        self._safe_prices = np.where(self.valid, prices, np.inf)
+        self._prices = np.where(self.valid, prices, 0)
+        self._dividends_per_share = np.nan_to_num(dividends_per_share)
+
+        # (候補数, 刻みの数) の配列
+        self.shares = np.floor_divide(self.amounts[None, :], self._safe_prices[:, None])
+        self.market_values = self.shares * self._prices[:, None]
+        self.dividends = self.shares * self._dividends_per_share[:, None]
+
+    def table(self, amount, held_market_value, held_dividends):
+        # 指定した購入金額での候補ごとの結果（刻みに丸めず、その金額で計算し直す）
+        shares = np.floor_divide(float(amount), self._safe_prices)
+        market_values = shares * self._prices
+        dividends = shares * self._dividends_per_share
+        columns = [column for column in ['企業名', '業種', '株価', '1株当たり配当金', '合計スコア'] if column in self.candidates.columns]
+        result = self.candidates[columns].reset_index(drop=True)
+        result['購入株数'] = shares
+        result['購入金額'] = market_values
+        result['推定配当金'] = dividends
+        result['時価の変化'] = market_values - held_market_value
+        result['配当金の変化'] = dividends - held_dividends
+        return result[self.valid].sort_values('推定配当金', ascending=False)
+
+    def frontier(self):
+        # 時価と配当金のどちらも他の組み合わせに劣らない（候補, 購入金額）の組み合わせ
+        market_values = self.market_values[self.valid].ravel()
+        dividends = self.dividends[self.valid].ravel()
+        candidate_rows = np.repeat(np.flatnonzero(self.valid), len(self.amounts))
+        amounts = np.tile(self.amounts, int(self.valid.sum()))
+
+        # 時価の高い順（同じ時価なら配当金の高い順）に並べ、配当金がそれまでの最大を上回る点だけを残す
+        order = np.lexsort((-dividends, -market_values))
+        best_so_far = np.maximum.accumulate(dividends[order])
+        keep = np.ones(len(order), dtype=bool)
+        keep[1:] = dividends[order][1:] > best_so_far[:-1]
+        selected = order[keep]
+
+        names = self.candidates['企業名'].to_numpy()
+        return pd.DataFrame({
+            '企業名': names[candidate_rows[selected]],
+            '購入金額上限': amounts[selected],
+            '時価': market_values[selected],
+            '推定配当金': dividends[selected],
+        }).sort_values('時価').reset_index(drop=True)
@@ -0,0 +1,97 @@
+# ベンチマーク用の架空のワークブック（Page 1 / Page 2 のシートと同じ列構成）を作成する
+import argparse
+
+import numpy as np
+from openpyxl import Workbook
+
+from ingest import SHEETS
+
+INDUSTRIES = ['銀行業', '電気機器', '小売業', '情報・通信業', '化学', '輸送用機器', '医薬品', '建設業']
+
+# 1回に作成する行数（100万行でも一定のメモリで書き出すため）
+CHUNK_ROWS = 10000
+
+PAGE1_YEARS = range(2020, 2025)
+DIVIDEND_YEARS = range(2020, 2024)
+
+
+def _page1_chunk(rng, start, n):
+    columns = {
+        '企業名': [f'企業{i}' for i in range(start, start + n)],
+        '業種': rng.choice(INDUSTRIES, n),
+        '自己資本比率': rng.uniform(5, 90, n).round(1),
+        'ROE': rng.uniform(-2, 20, n).round(2),
+        'ROA': rng.uniform(-1, 12, n).round(2),
+        'PER': rng.uniform(3, 40, n).round(1),
+        'PBR': rng.uniform(0.3, 5, n).round(2),
+        '配当利回り': rng.uniform(0, 0.06, n).round(4),
+    }
+    for year in PAGE1_YEARS:
+        columns[f'配当利回り{year}'] = rng.uniform(0, 0.06, n).round(4)
+    columns['時価'] = rng.uniform(1e6, 5e8, n).round(0)
+    # 配当金は前年から少しずつ変動させる
+    dividends = rng.uniform(1e4, 2e7, n)
+    for year in DIVIDEND_YEARS:
+        columns[f'配当金{year}'] = dividends.round(0)
+        dividends = dividends * np.exp(rng.normal(0.02, 0.15, n))
+    return columns
+
+
+def _page2_chunk(rng, start, n):
+    return {
+        '企業名': [f'候補{i}' for i in range(start, start + n)],
+        '業種': rng.choice(INDUSTRIES, n),
+        '自己資本比率': rng.uniform(5, 90, n).round(1),
+        'ROE': rng.uniform(-2, 20, n).round(2),
+        'ROA': rng.uniform(-1, 12, n).round(2),
+        'PER': rng.uniform(3, 40, n).round(1),
+        'PBR': rng.uniform(0.3, 5, n).round(2),
+        '配当利回り': rng.uniform(0, 0.06, n).round(4),
+        '株価': rng.uniform(200, 10000, n).round(0),
+        '1株当たり配当金': rng.uniform(0, 300, n).round(1),
+        '購入株数': rng.integers(1, 50, n) * 100,
+    }
+
+
+def _write_sheet(wb, title, make_chunk, rows, rng, missing):
+    ws = wb.create_sheet(title)
+    header = None
+    for start in range(0, rows, CHUNK_ROWS):
+        n = min(CHUNK_ROWS, rows - start)
+        columns = make_chunk(rng, start, n)
+        if header is None:
+            header = list(columns)
+            ws.append(header)
+        values = [list(column) for column in columns.values()]
+        # 指標の一部を空欄にする（企業名と業種は空欄にしない）
+        if missing > 0:
+            for values_of_column in values[2:]:
+                for i in np.flatnonzero(rng.random(n) < missing):
+                    values_of_column[i] = None
+        for row in zip(*values):
+            ws.append([value.item() if hasattr(value, 'item') else value for value in row])
+
+
+def make_workbook(path, rows, seed=0, missing=0.0):
+    """Page 1 と Page 2 のシートにそれぞれ rows 行のデータを持つワークブックを作成する。"""
+    rng = np.random.default_rng(seed)
+    # 書き込み専用モードでは行を順に書き出すだけで、シート全体をメモリに持たない
+    wb = Workbook(write_only=True)
+    _write_sheet(wb, SHEETS['page1_data'], _page1_chunk, rows, rng, missing)
+    _write_sheet(wb, SHEETS['page2_data'], _page2_chunk, rows, rng, missing)
+    wb.save(path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ベンチマーク用の架空のワークブックを作成する")
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--missing', type=float, default=0.0, help="空欄にする指標の割合")
+    args = parser.parse_args(argv)
+    make_workbook(args.path, args.rows, args.seed, args.missing)
+
+
+if __name__ == "__main__":
+    main()
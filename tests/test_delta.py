@@ -0,0 +1,115 @@
+# 差分だけで更新した派生データを、新しいデータから全て計算し直したものと比べる
+import numpy as np
+import pandas as pd
+import pytest
+
+from delta import RowDelta, change_summary, patch_scores
+from indexes import RANKING_METRICS, IndustryCube, RankingIndex
+from scoring import combine_scores, score_frame
+
+INDUSTRIES = ['銀行業', '化学', '医薬品', '小売業']
+
+
+def _frame(rng, n):
+    # 同じ値（同順位）と欠損値が多く出るよう、指標は少ない種類の値から選ぶ
+    df = pd.DataFrame({
+        '企業名': [f'企業{i}' for i in range(n)],
+        '業種': rng.choice(INDUSTRIES, n),
+    })
+    for metric in RANKING_METRICS:
+        values = rng.integers(0, 8, n).astype(float) * 2.5
+        values[rng.random(n) < 0.15] = np.nan
+        df[metric] = values
+    return df
+
+
+def _edited(rng, old):
+    # 値の変更・行の削除・行の追加（同名の企業、新しい業種、業種の空欄を含む）をしたデータ
+    new = old.copy()
+    modified = rng.choice(len(old), 4, replace=False)
+    new.loc[modified, 'ROE'] = [np.nan, 5.0, 7.5, 100.0]
+    new.loc[modified[0], 'PER'] = 2.5
+    # 企業0は残し、追加する同名の企業0が別の行になるようにする
+    new = new.drop(index=rng.choice(np.arange(1, len(old)), 3, replace=False))
+    added = _frame(rng, 3).assign(企業名=['新企業A', '企業0', '新企業B'], 業種=['電気機器', '銀行業', None])
+    return pd.concat([new, added], ignore_index=True)
+
+
+@pytest.fixture(params=range(5))
+def frames(request):
+    rng = np.random.default_rng(request.param)
+    old = _frame(rng, 40)
+    return old, _edited(rng, old)
+
+
+def test_row_delta_classifies_rows(frames):
+    old, new = frames
+    delta = RowDelta(old, new)
+    old_names = set(old['企業名'])
+    new_names = set(new['企業名'])
+
+    assert set(old['企業名'].iloc[delta.removed]) == old_names - new_names
+    # 同名の2つ目の企業0は、既にある企業0とは別の行として追加される
+    assert list(new['企業名'].iloc[delta.added]) == ['新企業A', '企業0', '新企業B']
+    assert len(delta.modified_old) == len(delta.modified_new)
+    assert (old['企業名'].iloc[delta.modified_old].to_numpy() == new['企業名'].iloc[delta.modified_new].to_numpy()).all()
+    for old_position, new_position in enumerate(delta.old_to_new):
+        if new_position >= 0:
+            pd.testing.assert_series_equal(old.iloc[old_position], new.iloc[new_position], check_names=False)
+    assert delta.order_kept
+
+
+def test_patch_scores_matches_full_rescore(frames):
+    old, new = frames
+    delta = RowDelta(old, new)
+    patched = patch_scores(score_frame(old), new, delta)
+    pd.testing.assert_frame_equal(patched, score_frame(new))
+
+
+def test_ranking_patched_matches_rebuild(frames):
+    old, new = frames
+    delta = RowDelta(old, new)
+    patched = RankingIndex(old).patched(new, delta.old_to_new, delta.changed)
+    rebuilt = RankingIndex(new)
+    for ascending in (False, True):
+        np.testing.assert_array_equal(patched.order[ascending], rebuilt.order[ascending])
+        np.testing.assert_array_equal(patched.rank_of[ascending], rebuilt.rank_of[ascending])
+    np.testing.assert_array_equal(patched.counts, rebuilt.counts)
+
+
+def test_industry_cube_update_matches_rebuild(frames):
+    old, new = frames
+    delta = RowDelta(old, new)
+    columns = RANKING_METRICS
+    original = IndustryCube(old.set_axis(delta.old_keys), columns)
+    before = original.table.copy()
+
+    cube = original.copy()
+    cube.update(new.iloc[delta.changed].set_axis(delta.new_keys[delta.changed]), removed=delta.old_keys[delta.removed])
+    rebuilt = IndustryCube(new.set_axis(delta.new_keys), columns)
+
+    pd.testing.assert_frame_equal(cube.table, rebuilt.table)
+    # 複製した集計値の更新は元の集計値に影響しない
+    pd.testing.assert_frame_equal(original.table, before)
+
+
+def test_change_summary(frames):
+    old, new = frames
+    delta = RowDelta(old, new)
+    old_scored = combine_scores(old, score_frame(old))
+    new_scored = combine_scores(new, score_frame(new))
+    summary = change_summary(old, new, old_scored, new_scored, delta)
+
+    counts = summary['変更'].value_counts().to_dict()
+    assert counts == {'追加': len(delta.added), '削除': len(delta.removed), '変更': len(delta.modified_old)}
+    modified = summary[summary['変更'] == '変更']
+    assert modified['変更した列'].str.contains('ROE').all()
+    assert (summary['差'].dropna() == (summary['合計スコア（後）'] - summary['合計スコア（前）']).dropna()).all()
+
+
+def test_unchanged_data_has_empty_delta():
+    old = _frame(np.random.default_rng(0), 20)
+    delta = RowDelta(old, old.copy())
+    assert delta.empty and delta.patchable
+    assert change_summary(old, old, combine_scores(old, score_frame(old)), combine_scores(old, score_frame(old)),
+                          delta).empty
@@ -0,0 +1,63 @@
+# DerivedCache の計算中のロック（別の段階は同時に計算でき、同じ結果は1回だけ計算する）
+import threading
+import time
+
+import pandas as pd
+
+import derived
+from derived import DerivedCache, stage
+
+
+def _slow_stage(name, calls, release):
+    @stage(name, ['test_source'])
+    def _compute(source):
+        calls.append(name)
+        release.wait(5)
+        return len(source)
+
+
+def test_other_stages_run_while_one_is_computing():
+    calls, release = [], threading.Event()
+    _slow_stage('test_slow', calls, release)
+    stage('test_fast', ['test_source'])(len)
+    try:
+        cache = DerivedCache()
+        cache.set_source('test_source', 'v1', pd.DataFrame({'a': range(3)}))
+        slow = threading.Thread(target=cache.get, args=('test_slow',))
+        slow.start()
+        while not calls:
+            time.sleep(0.01)
+
+        # 遅い段階の計算中でも、別の段階はすぐに計算できる
+        start = time.perf_counter()
+        assert cache.get('test_fast') == 3
+        assert time.perf_counter() - start < 1
+        release.set()
+        slow.join()
+    finally:
+        release.set()
+        for name in ['test_slow', 'test_fast']:
+            derived.STAGES.pop(name, None)
+
+
+def test_same_result_is_computed_once():
+    calls, release = [], threading.Event()
+    _slow_stage('test_slow', calls, release)
+    try:
+        cache = DerivedCache()
+        cache.set_source('test_source', 'v1', pd.DataFrame({'a': range(3)}))
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('test_slow'))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        while not calls:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert results == [3] * 4
+        assert calls == ['test_slow']
+        assert cache.stats['test_slow']['misses'] == 1
+    finally:
+        release.set()
+        derived.STAGES.pop('test_slow', None)
@@ -0,0 +1,79 @@
+# optimize_portfolio の結果を、小さな問題での全ての組み合わせの列挙と比べる
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from optimizer import optimize_portfolio
+
+
+def _brute_force(df, budget, lot_size, max_weight, industry_caps):
+    # 全ての購入単位数の組み合わせから、条件を満たし推定配当金が最大のものを求める
+    prices = df['株価'].to_numpy(dtype=float) * lot_size
+    dividends = df['1株当たり配当金'].to_numpy(dtype=float) * lot_size
+    industries = df['業種'].to_numpy()
+    ranges = [range(int(budget * max_weight // price) + 1) for price in prices]
+    best = 0.0
+    for lots in itertools.product(*ranges):
+        spent = prices * lots
+        if spent.sum() > budget:
+            continue
+        if any(spent[industries == industry].sum() > budget * cap for industry, cap in industry_caps.items()):
+            continue
+        best = max(best, float(dividends @ lots))
+    return best
+
+
+def _candidates(rng, n, industries):
+    return pd.DataFrame({
+        '企業名': [f'企業{i}' for i in range(n)],
+        '業種': rng.choice(industries, n),
+        '株価': rng.integers(50, 400, n),
+        '1株当たり配当金': rng.integers(1, 30, n).astype(float),
+        '合計スコア': rng.integers(6, 31, n),
+    })
+
+
+@pytest.mark.parametrize('seed', range(12))
+def test_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    df = _candidates(rng, 4, ['銀行業', '化学', '医薬品'])
+    lot_size = int(rng.choice([1, 2]))
+    max_weight = float(rng.choice([0.5, 1.0]))
+    industry_caps = {'銀行業': 0.3} if seed % 2 else {}
+    # 1マス = 1円にすると金額の切り上げがなく、動的計画法の結果は最適解と一致する
+    budget = 1000
+    result = optimize_portfolio(df, budget, lot_size=lot_size, max_weight=max_weight, industry_caps=industry_caps,
+                                cells=budget)
+
+    assert result['推定配当金'].sum() == pytest.approx(_brute_force(df, budget, lot_size, max_weight, industry_caps))
+    assert result['購入金額'].sum() <= budget
+    assert (result['購入金額'] <= budget * max_weight).all()
+    for industry, cap in industry_caps.items():
+        assert result.loc[result['業種'] == industry, '購入金額'].sum() <= budget * cap
+
+
+def test_missing_industry_is_a_group():
+    # 業種が空欄の候補も購入の対象にする
+    df = pd.DataFrame({
+        '企業名': ['A', 'B', 'C'],
+        '業種': ['銀行業', None, '化学'],
+        '株価': [100, 100, 100],
+        '1株当たり配当金': [1.0, 10.0, 0.5],
+        '合計スコア': [20, 20, 20],
+    })
+    result = optimize_portfolio(df, 1000, max_weight=0.5, cells=1000)
+    assert result.set_index('企業名')['購入株数'].to_dict() == {'B': 5, 'A': 5}
+
+
+def test_min_score_and_budget_limits():
+    rng = np.random.default_rng(0)
+    df = _candidates(rng, 30, ['銀行業', '化学', '医薬品', '小売業'])
+    result = optimize_portfolio(df, 100000, lot_size=1, max_weight=0.2, min_score=15,
+                                industry_caps={'化学': 0.1})
+    assert not result.empty
+    assert (result['合計スコア'] >= 15).all()
+    assert result['購入金額'].sum() <= 100000
+    assert (result['構成比'] <= 0.2 + 1e-9).all()
+    assert result.loc[result['業種'] == '化学', '購入金額'].sum() <= 10000
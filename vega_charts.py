@@ -0,0 +1,205 @@
+# ブラウザで描画する Vega-Lite のグラフ定義
+# サーバーからはグラフの元データだけを送り、座標の計算と描画はブラウザで行う
+import math
+
+import numpy as np
+
+# matplotlib のインチ指定をピクセルに換算する係数
+PIXELS_PER_INCH = 80
+
+# レーダーチャートの目盛りの最大値（スコアは1〜5点）
+RADAR_MAX_SCORE = 5
+
+
+def _json_value(value):
+    # グラフ定義全体を JSON に変換できる値にする
+    # numpy の値（float32 や int64 など）は Python の値にし、NaN・無限大は JSON で表せないため欠損として送る
+    if isinstance(value, dict):
+        return {key: _json_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_value(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _radar_position(radius_expr, n):
+    # 項目番号 idx から極座標の角度と x, y 座標を計算する（matplotlib と同じく右から反時計回り）
+    return [
+        {'calculate': f'2 * PI * datum.idx / {n}', 'as': 'theta'},
+        {'calculate': f'({radius_expr}) * cos(datum.theta)', 'as': 'x'},
+        {'calculate': f'({radius_expr}) * sin(datum.theta)', 'as': 'y'},
+    ]
+
+
+def _radar_layers(data, categories, titles, linewidth, color=None):
+    n = len(categories)
+    limit = RADAR_MAX_SCORE * 1.3
+    xy = {
+        'x': {'field': 'x', 'type': 'quantitative', 'axis': None, 'scale': {'domain': [-limit, limit]}},
+        'y': {'field': 'y', 'type': 'quantitative', 'axis': None, 'scale': {'domain': [-limit, limit]}},
+    }
+
+    rows = []
+    for title, values in zip(titles, data):
+        for idx, value in enumerate(values):
+            rows.append({'企業名': title, 'idx': idx, 'score': value})
+
+    if color:
+        series_color = {'value': color}
+    else:
+        series_color = {'field': '企業名', 'type': 'nominal', 'sort': list(titles), 'legend': {'title': None}}
+
+    return [
+        # 目盛りの多角形（ブラウザ側で生成する）
+        {
+            'data': {'sequence': {'start': 0, 'stop': n * RADAR_MAX_SCORE, 'as': 'i'}},
+            'transform': [
+                {'calculate': f'floor(datum.i / {n}) + 1', 'as': 'level'},
+                {'calculate': f'datum.i % {n}', 'as': 'idx'},
+            ] + _radar_position('datum.level', n),
+            'mark': {'type': 'line', 'interpolate': 'linear-closed', 'color': 'lightgray', 'strokeWidth': 0.8},
+            'encoding': {**xy, 'detail': {'field': 'level'}, 'order': {'field': 'idx'}},
+        },
+        # 項目名
+        {
+            'data': {'values': [{'idx': idx, 'label': label} for idx, label in enumerate(categories)]},
+            'transform': _radar_position(RADAR_MAX_SCORE * 1.15, n),
+            'mark': {'type': 'text'},
+            'encoding': {**xy, 'text': {'field': 'label'}},
+        },
+        # 企業ごとのスコア
+        {
+            'data': {'values': rows},
+            'transform': _radar_position('datum.score', n),
+            'mark': {'type': 'line', 'interpolate': 'linear-closed', 'strokeWidth': linewidth, 'point': True},
+            'encoding': {**xy, 'color': series_color, 'detail': {'field': '企業名'}, 'order': {'field': 'idx'}},
+        },
+        # スコアの表示
+        {
+            'data': {'values': rows},
+            'transform': _radar_position('datum.score * 1.1', n),
+            'mark': {'type': 'text', 'color': 'black'},
+            'encoding': {**xy, 'text': {'field': 'score'}},
+        },
+    ]
+
+
+def radar_multiple_spec(data, categories, titles, chart_size, label_size, linewidth=1.5):
+    return {
+        'width': chart_size[0] * PIXELS_PER_INCH,
+        'height': chart_size[1] * PIXELS_PER_INCH,
+        'layer': _radar_layers(data, categories, titles, linewidth),
+        'config': {'legend': {'labelFontSize': label_size}, 'view': {'stroke': None}},
+    }
+
+
+def radar_side_by_side_spec(data, categories, titles, chart_size):
+    charts = []
+    for values, title in zip(data, titles):
+        charts.append({
+            'title': f"{title} (合計スコア: {round(sum(values), 2)})",
+            'width': chart_size[0] * PIXELS_PER_INCH,
+            'height': chart_size[1] * PIXELS_PER_INCH,
+            'layer': _radar_layers([values], categories, [title], linewidth=2, color='blue'),
+        })
+    return {'concat': charts, 'columns': 2, 'config': {'view': {'stroke': None}}}
+
+
+def bar_spec(labels, series, xlabel, ylabel, title):
+    rows = []
+    for values, label, color in series:
+        for name, value in zip(labels, values):
+            rows.append({'企業名': name, '系列': label, '値': value})
+
+    encoding = {
+        'x': {'field': '企業名', 'type': 'nominal', 'sort': list(labels), 'title': xlabel, 'axis': {'labelAngle': -45}},
+        'xOffset': {'field': '系列', 'sort': [label for _, label, _ in series]},
+        'y': {'field': '値', 'type': 'quantitative', 'title': ylabel},
+        'color': {
+            'field': '系列', 'type': 'nominal', 'legend': {'title': None},
+            'scale': {'domain': [label for _, label, _ in series], 'range': [color for _, _, color in series]},
+        },
+    }
+    return {
+        'title': title,
+        'data': {'values': rows},
+        'encoding': encoding,
+        'layer': [
+            {'mark': {'type': 'bar', 'opacity': 0.8}},
+            {'mark': {'type': 'text', 'dy': -6}, 'encoding': {'text': {'field': '値', 'format': ',.0f'}, 'color': {'value': 'black'}}},
+        ],
+    }
+
+
+def comparison_bar_spec(labels, values, ylabel, tick_step=None):
+    y = {'field': '値', 'type': 'quantitative', 'title': ylabel, 'axis': {'format': ',.0f'}}
+    if tick_step:
+        y['axis']['tickMinStep'] = tick_step
+    return {
+        'data': {'values': [{'項目': label, '値': value} for label, value in zip(labels, values)]},
+        'encoding': {
+            'x': {'field': '項目', 'type': 'nominal', 'sort': list(labels), 'title': None, 'axis': {'labelAngle': 0}},
+            'y': y,
+        },
+        'layer': [
+            {'mark': {'type': 'bar'}, 'encoding': {'color': {'field': '項目', 'scale': {'range': ['blue', 'green']}, 'legend': None}}},
+            {'mark': {'type': 'text', 'dy': -6}, 'encoding': {'text': {'field': '値', 'format': ',.0f'}}},
+        ],
+    }
+
+
+def frontier_spec(market_values, dividends, labels):
+    rows = [{'時価': value, '推定配当金': dividend, '企業名': label}
+            for value, dividend, label in zip(market_values, dividends, labels)]
+    return {
+        'data': {'values': rows},
+        'transform': [{'calculate': 'datum["時価"] / 1000000', 'as': '時価（百万円）'}],
+        'mark': {'type': 'line', 'point': True, 'color': 'green'},
+        'encoding': {
+            'x': {'field': '時価（百万円）', 'type': 'quantitative', 'title': '買い替え後の時価（百万円）'},
+            'y': {'field': '推定配当金', 'type': 'quantitative', 'title': '推定配当金（円）', 'axis': {'format': ',.0f'}},
+            'order': {'field': '時価', 'type': 'quantitative'},
+            'tooltip': [
+                {'field': '企業名', 'type': 'nominal'},
+                {'field': '時価', 'type': 'quantitative', 'format': ',.0f'},
+                {'field': '推定配当金', 'type': 'quantitative', 'format': ',.0f'},
+            ],
+        },
+    }
+
+
+def histogram_spec(edges, series, xlabel):
+    rows = []
+    for counts, label, color in series:
+        for start, end, count in zip(edges[:-1], edges[1:], counts):
+            rows.append({'系列': label, '開始': start, '終了': end, '件数': count})
+    return {
+        'data': {'values': rows},
+        'mark': {'type': 'rect', 'opacity': 0.4},
+        'encoding': {
+            'x': {'field': '開始', 'type': 'quantitative', 'title': xlabel, 'axis': {'format': ',.0f'}},
+            'x2': {'field': '終了'},
+            'y': {'field': '件数', 'type': 'quantitative', 'title': 'シナリオの数', 'stack': None},
+            'color': {
+                'field': '系列', 'type': 'nominal', 'legend': {'title': None},
+                'scale': {'domain': [label for _, label, _ in series], 'range': [color for _, _, color in series]},
+            },
+        },
+    }
+
+
+VEGA_SPECS = {
+    'radar_multiple': radar_multiple_spec,
+    'radar_side_by_side': radar_side_by_side_spec,
+    'bar': bar_spec,
+    'comparison_bar': comparison_bar_spec,
+    'frontier': frontier_spec,
+    'histogram': histogram_spec,
+}
+
+
+def chart_spec(chart_type, **params):
+    return _json_value(VEGA_SPECS[chart_type](**params))
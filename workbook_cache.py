@@ -0,0 +1,117 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+from pyarrow import ArrowInvalid
+
+# キャッシュの保存先と容量の上限（環境変数で変更可能）
+CACHE_DIR = os.environ.get('WORKBOOK_CACHE_DIR', os.path.join('.cache', 'workbooks'))
+MAX_CACHE_BYTES = int(os.environ.get('WORKBOOK_CACHE_MAX_MB', '512')) * 1024 * 1024
+
+
+def content_hash(data):
+    # ファイルの中身からキャッシュキーを作る（ファイル名は使わない）
+    return hashlib.sha256(data).hexdigest()
+
+
+def _entry_dir(digest):
+    return os.path.join(CACHE_DIR, digest)
+
+
+def _sheet_path(digest, sheet_name, extension='parquet'):
+    # シート名には記号が含まれるため、ファイル名にはハッシュを使う
+    sheet_key = hashlib.md5(sheet_name.encode('utf-8')).hexdigest()
+    return os.path.join(_entry_dir(digest), f"{sheet_key}.{extension}")
+
+
+def load_cached_sheets(digest, sheet_names):
+    # キャッシュ済みのシートだけを返す（ワークブックにないと記録したシートの値は None）
+    # キャッシュは高速化のためだけのもので、読めない場合はエントリを削除して空を返す（ワークブックから読み込み直す）
+    sheets = {}
+    try:
+        for sheet_name in sheet_names:
+            path = _sheet_path(digest, sheet_name)
+            if os.path.exists(path):
+                sheets[sheet_name] = pd.read_parquet(path)
+            elif os.path.exists(_sheet_path(digest, sheet_name, 'absent')):
+                sheets[sheet_name] = None
+        if sheets:
+            # 最終利用時刻を更新（LRU の判定に使う）
+            os.utime(_entry_dir(digest))
+    except (OSError, ArrowInvalid):
+        shutil.rmtree(_entry_dir(digest), ignore_errors=True)
+        return {}
+    return sheets
+
+
+def _write_parquet(digest, sheet_name, df):
+    # 同じワークブックを複数のセッションで同時に保存しても混ざらないよう、書き込みごとに別の一時ファイルを使う
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=_entry_dir(digest))
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, _sheet_path(digest, sheet_name))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def store_sheets(digest, sheets, absent=()):
+    # absent: ワークブックにないシート（空の印のファイルを置き、次回はワークブックを開かずに済ませる）
+    # 保存できなくても読み込み自体は続けられるため、ディスクの容量不足などのエラーは無視する
+    try:
+        os.makedirs(_entry_dir(digest), exist_ok=True)
+        for sheet_name in absent:
+            open(_sheet_path(digest, sheet_name, 'absent'), 'w').close()
+        for sheet_name, df in sheets.items():
+            try:
+                _write_parquet(digest, sheet_name, df)
+            except (ValueError, TypeError, NotImplementedError):
+                # 型が混在した列などParquetに保存できないシートはキャッシュしない
+                continue
+        evict(MAX_CACHE_BYTES)
+    except OSError:
+        pass
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            # 他のセッションが削除・置き換えたファイルは数えない
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def cache_size():
+    if not os.path.isdir(CACHE_DIR):
+        return 0
+    return _dir_size(CACHE_DIR)
+
+
+def evict(max_bytes):
+    # 容量を超えた分を、最後に使われた時刻が古い順に削除する
+    if not os.path.isdir(CACHE_DIR):
+        return
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, name)
+        if os.path.isdir(path):
+            entries.append((os.path.getmtime(path), _dir_size(path), path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def clear_cache():
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+